@@ -0,0 +1,210 @@
+import pandas as pd
+
+# The aggregate tables written alongside the detail tables for PowerBI
+AGGREGATE_TABLES = ["question_year_summary", "student_domain_summary", "subdomain_testLevel_summary"]
+
+# The columns each answer is counted by within a file, the question details are looked up once every file has been read
+ANSWER_KEYS = ["questionId", "domain.domainName", "student.testLevel"]
+
+STUDENT_KEYS = ["student.metadata.schoolStudentId", "domain.domainId", "domain.domainName", "student.testLevel"]
+
+QUESTION_LOOKUP_COLUMNS = ["year", "questionId", "questionIdentifier", "subdomain"]
+
+
+def correct_percentage(df):
+    """
+    Add the percentage of answers that were correct to a table of answer counts.
+
+    Parameters:
+    df: pd.DataFrame
+    The table with answered and correct columns.
+
+    Returns:
+    pd.DataFrame
+    The table with a correctPercentage column.
+    """
+    df["correctPercentage"] = (100 * df["correct"] / df["answered"].where(df["answered"] > 0)).round(2)
+    return df
+
+
+def count_answers(answer_counts, keys):
+    """
+    Total the answered and correct counts by a set of columns.
+
+    Parameters:
+    answer_counts: pd.DataFrame
+    The answered and correct counts.
+
+    keys: list
+    The columns to total by.
+
+    Returns:
+    pd.DataFrame
+    The totals, one row per distinct set of keys.
+    """
+    return answer_counts.groupby(keys, dropna=False, observed=True, sort=True)[["answered", "correct"]].sum().reset_index()
+
+
+def total_student_scores(student_scores, keys):
+    """
+    Total the scores of each student in each domain.
+
+    Parameters:
+    student_scores: pd.DataFrame
+    The scores of each student in each domain, a student can have more than one row per domain.
+
+    keys: list
+    The columns identifying a student in a domain.
+
+    Returns:
+    pd.DataFrame
+    The totals, one row per distinct set of keys.
+    """
+    grouped = student_scores.groupby(keys, dropna=False, observed=True, sort=True)
+    return pd.DataFrame({
+        "answered": grouped["answered"].sum(min_count=1),
+        "correct": grouped["correct"].sum(min_count=1),
+        "rawScore": grouped["rawScore"].sum(min_count=1),
+        "scaledScore": grouped["scaledScore"].max(),
+    }).reset_index()
+
+
+def summarize_attempts(attempts, writing_attempts):
+    """
+    Count the answers and total the scores in extracted attempts, so the aggregate tables
+    can be built without going back over the detail rows.
+
+    Parameters:
+    attempts: pd.DataFrame
+    The extracted attempts, one row per answer.
+
+    writing_attempts: pd.DataFrame
+    The extracted writing attempts, one row per marking scheme component.
+
+    Returns:
+    dict
+    The answer counts by question and the scores of each student in each domain.
+    """
+    attempts = attempts.reindex(columns=list(dict.fromkeys(ANSWER_KEYS + STUDENT_KEYS + ["correct", "scaledScore"])))
+    attempts["answered"] = 1
+    attempts["correct"] = attempts["correct"].fillna(False).eq(True).astype("int64")
+
+    answer_counts = count_answers(attempts, ANSWER_KEYS)
+
+    # Each answer row repeats the scaled score of its attempt, a non-writing raw score is the number of correct answers
+    attempts["rawScore"] = attempts["correct"]
+    student_scores = [attempts]
+
+    # The writing raw score is the total of the marking scheme components, unmarked tests have no score
+    writing_attempts = writing_attempts.reindex(columns=STUDENT_KEYS + ["effectiveScore", "scaledScore"])
+    if not writing_attempts.empty:
+        writing_attempts["answered"] = float("nan")
+        writing_attempts["correct"] = float("nan")
+        writing_attempts["rawScore"] = pd.to_numeric(writing_attempts["effectiveScore"], errors="coerce")
+        student_scores.append(writing_attempts)
+
+    student_scores = pd.concat([df.reindex(columns=STUDENT_KEYS + ["answered", "correct", "rawScore", "scaledScore"]) for df in student_scores], ignore_index=True)
+
+    return {
+        "answer_counts": answer_counts,
+        "student_domain_scores": total_student_scores(student_scores, STUDENT_KEYS),
+    }
+
+
+def concat_summaries(summaries, name):
+    """
+    Concatenate one table from a list of summaries, leaving out the empty ones so they don't change the column types.
+
+    Parameters:
+    summaries: list
+    The summaries from summarize_attempts.
+
+    name: str
+    The name of the table to concatenate.
+
+    Returns:
+    pd.DataFrame
+    The concatenated table.
+    """
+    frames = [summary[name] for summary in summaries if not summary[name].empty]
+    if not frames:
+        return summaries[-1][name]
+    return pd.concat(frames, ignore_index=True)
+
+
+def summarize_file(document, attempts, writing_attempts, year, batch_summaries=()):
+    """
+    Build the partial aggregates for one raw NAPLAN file.
+
+    Parameters:
+    document: extract_data.ParsedDocument
+    The parsed NAPLAN file, its questions give the details of each questionId.
+
+    attempts: pd.DataFrame
+    The attempts extracted from the file.
+
+    writing_attempts: pd.DataFrame
+    The writing attempts extracted from the file.
+
+    year: str
+    The year the file is for.
+
+    batch_summaries: list
+    The summaries of attempts that were written out in batches in streaming mode.
+
+    Returns:
+    dict
+    The answer counts, student domain scores and question lookup for the file, keyed by table name.
+    """
+    summaries = list(batch_summaries) + [summarize_attempts(attempts, writing_attempts)]
+
+    answer_counts = concat_summaries(summaries, "answer_counts")
+    answer_counts["year"] = year
+
+    student_scores = concat_summaries(summaries, "student_domain_scores")
+    student_scores["year"] = year
+
+    question_lookup = document.questions.reindex(columns=QUESTION_LOOKUP_COLUMNS)
+    question_lookup["year"] = year
+
+    return {
+        "answer_counts": count_answers(answer_counts, ["year"] + ANSWER_KEYS),
+        "student_domain_scores": total_student_scores(student_scores, ["year"] + STUDENT_KEYS),
+        "question_lookup": question_lookup,
+    }
+
+
+def build_aggregates(answer_counts, student_domain_scores, question_lookup):
+    """
+    Build the aggregate tables from the partial aggregates of every file.
+
+    Parameters:
+    answer_counts: pd.DataFrame
+    The answer counts by question from every file.
+
+    student_domain_scores: pd.DataFrame
+    The scores of each student in each domain from every file.
+
+    question_lookup: pd.DataFrame
+    The questionIdentifier and subdomain of each questionId in each year.
+
+    Returns:
+    dict
+    The aggregate tables, keyed by table name.
+    """
+    answer_counts = answer_counts.reindex(columns=["year"] + ANSWER_KEYS + ["answered", "correct"])
+    question_lookup = question_lookup.reindex(columns=QUESTION_LOOKUP_COLUMNS).drop_duplicates(subset=["year", "questionId"])
+    answers = answer_counts.merge(question_lookup, on=["year", "questionId"], how="left")
+
+    question_year = count_answers(answers, ["year", "questionId", "questionIdentifier", "domain.domainName", "subdomain"])
+
+    subdomain_testLevel = count_answers(answers, ["year", "domain.domainName", "subdomain", "student.testLevel"])
+
+    student_domain_scores = student_domain_scores.reindex(columns=["year"] + STUDENT_KEYS + ["answered", "correct", "rawScore", "scaledScore"])
+    student_domain = total_student_scores(student_domain_scores, ["year"] + STUDENT_KEYS)
+
+    return {
+        "question_year_summary": correct_percentage(question_year),
+        "student_domain_summary": correct_percentage(student_domain),
+        "subdomain_testLevel_summary": correct_percentage(subdomain_testLevel),
+    }
@@ -0,0 +1,76 @@
+# The consistency checks that can be run over the questions, each one looks for questionIdentifiers
+# with more than one value of a field across the years and exports the rows that differ
+AUDIT_CHECKS = {
+    "descriptor": "duplicate_descriptors.csv",
+    "domain": "duplicate_domains.csv",
+    "subdomain": "duplicate_subdomains.csv",
+    "testLevel": "duplicate_testLevels.csv",
+}
+
+DEFAULT_AUDIT_CHECKS = ["descriptor"]
+
+
+def find_field_drift(questions, field, key="questionIdentifier"):
+    """
+    Find the questions whose key has more than one value of a field, in a single grouped pass.
+
+    Parameters:
+    questions: pd.DataFrame
+    The questions from every year.
+
+    field: str
+    The field that should have one value per key.
+
+    key: str
+    The column identifying a question across years.
+
+    Returns:
+    pd.DataFrame
+    The distinct key, field and year rows for each key with more than one value of the field,
+    ordered by key.
+    """
+    # Mark every row whose key has more than one distinct value of the field
+    mask = questions.groupby(key)[field].transform("nunique") > 1
+
+    drift = questions.loc[mask, [key, field, "year"]].drop_duplicates()
+
+    # A stable sort keeps the rows for each key in the order they were extracted
+    return drift.sort_values(key, kind="stable").reset_index(drop=True)
+
+
+def run_audits(questions, checks=DEFAULT_AUDIT_CHECKS):
+    """
+    Run consistency checks over the questions, exporting the rows that fail each check to a CSV file.
+
+    Parameters:
+    questions: pd.DataFrame
+    The questions from every year.
+
+    checks: list
+    The names of the checks in AUDIT_CHECKS to run.
+
+    Returns:
+    dict
+    The rows that failed each check, keyed by check name.
+    """
+    results = {}
+    for field in checks:
+        output_file = AUDIT_CHECKS[field]
+        if field not in questions.columns:
+            print(f"Skipping the {field} check, the questions have no {field} column.")
+            continue
+
+        drift = find_field_drift(questions, field)
+        results[field] = drift
+
+        if drift.empty:
+            print(f"No questionIdentifiers found with different {field} values.")
+            continue
+
+        print(f"Found {drift['questionIdentifier'].nunique()} questionIdentifiers with different {field} values:")
+
+        # Export the duplicates to a CSV file
+        drift.to_csv(output_file, index=False)
+        print(f"Exported {len(drift)} duplicate records to '{output_file}'")
+
+    return results
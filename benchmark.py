@@ -0,0 +1,225 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import sys
+import time
+import tracemalloc
+import database_interaction
+import database_load
+import extract_data
+import json_backend
+from generate_synthetic_data import generate_naplan_file
+
+# The number of students in the generated file for each benchmark size
+SIZES = {
+    "small": 100,
+    "medium": 1000,
+    "large": 5000,
+}
+
+DEFAULT_BASELINE_FILE = "benchmark_baseline.json"
+
+# A stage has regressed when it is this much slower or uses this much more memory than the baseline
+DEFAULT_TOLERANCE = 0.25
+
+# Stages faster than this are too noisy to flag as regressions
+MINIMUM_SECONDS = 0.05
+
+
+def measure(function, repeat=3):
+    """
+    Measure the wall time and peak memory of a function.
+
+    The time is the best of several runs without memory tracing, the peak memory comes from
+    one more run with tracemalloc, which slows the code down too much to time at the same time.
+
+    Parameters:
+    function: callable
+    The function to measure, it is called with no arguments.
+
+    repeat: int
+    The number of timed runs.
+
+    Returns:
+    dict
+    The best wall time in seconds and the peak memory in MB.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds": round(min(timings), 4), "peak_mb": round(peak / 1024 / 1024, 2)}
+
+
+def insert_stage(insert, table):
+    """
+    Build a stage that inserts a table into a fresh in-memory database.
+
+    Parameters:
+    insert: callable
+    The insert_* function from database_interaction.
+
+    table: pd.DataFrame
+    The rows to insert.
+
+    Returns:
+    callable
+    The stage.
+    """
+    def stage():
+        conn = sqlite3.connect(":memory:")
+        database_interaction.create_tables(conn)
+        insert(conn, table)
+        conn.close()
+    return stage
+
+
+def run_benchmark(students, seed=0, repeat=3):
+    """
+    Benchmark each stage of the pipeline on a generated file.
+
+    Parameters:
+    students: int
+    The number of students in the generated file.
+
+    seed: int
+    The seed for the generated file.
+
+    repeat: int
+    The number of timed runs of each stage.
+
+    Returns:
+    dict
+    The wall time and peak memory of each stage, keyed by stage name.
+    """
+    raw = generate_naplan_file(2023, students=students, seed=seed)
+    raw_bytes = json.dumps(raw).encode("utf-8")
+    del raw
+
+    backend = json_backend.select_backend()
+    results = {}
+    results["json_load"] = measure(lambda: json_backend.decode(raw_bytes, backend), repeat)
+
+    raw = json_backend.decode(raw_bytes, backend)
+    results["parse_document"] = measure(lambda: extract_data.ParsedDocument(raw), repeat)
+    document = extract_data.ParsedDocument(raw)
+
+    # A document normalizes its domains and cut points once and keeps them, so each run gets a fresh
+    # document holding only that section, otherwise every run after the first would time the cached frame
+    domains = {"domains": raw.get("domains", [])}
+    proficiency = {"proficiencyScoreCutOffPoints": raw.get("proficiencyScoreCutOffPoints", [])}
+    del raw
+
+    results["extract_domains"] = measure(lambda: extract_data.extract_domains(extract_data.ParsedDocument(domains)), repeat)
+    results["extract_proficiency"] = measure(lambda: extract_data.extract_proficiency(extract_data.ParsedDocument(proficiency)), repeat)
+    results["extract_questions"] = measure(lambda: extract_data.extract_questions(document, "2023"), repeat)
+    results["extract_attempts"] = measure(lambda: extract_data.extract_attempts(document), repeat)
+    results["extract_writing_attempts"] = measure(lambda: extract_data.extract_writing_attempts(document), repeat)
+
+    tables = database_load.build_database_tables(document, "2023", "benchmark.json")
+    results["insert_domains"] = measure(insert_stage(database_interaction.insert_domains, tables["domains"]), repeat)
+    results["insert_questions"] = measure(insert_stage(database_interaction.insert_questions, tables["questions"]), repeat)
+    results["insert_students"] = measure(insert_stage(database_interaction.insert_students, tables["naplan_students"]), repeat)
+    results["insert_students_scores"] = measure(insert_stage(database_interaction.insert_students_scores, tables["student_scores"]), repeat)
+    results["insert_attempts"] = measure(insert_stage(database_interaction.insert_attempts, tables["attempts"]), repeat)
+    results["insert_writing_responses"] = measure(insert_stage(database_interaction.insert_writing_responses, tables["writing_responses"]), repeat)
+
+    return results
+
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    Compare benchmark results with a baseline.
+
+    Parameters:
+    results: dict
+    The results of each stage, keyed by size then stage name.
+
+    baseline: dict
+    The baseline results, in the same layout.
+
+    tolerance: float
+    How much slower or bigger a stage can be before it counts as a regression.
+
+    Returns:
+    list
+    A description of each regression.
+    """
+    regressions = []
+    for size, stages in results.items():
+        for stage, result in stages.items():
+            expected = baseline.get(size, {}).get(stage)
+            if expected is None:
+                continue
+
+            if result["seconds"] > MINIMUM_SECONDS and result["seconds"] > expected["seconds"] * (1 + tolerance):
+                regressions.append(f"{size} {stage}: {result['seconds']:.3f}s, baseline {expected['seconds']:.3f}s")
+            if result["peak_mb"] > 1 and result["peak_mb"] > expected["peak_mb"] * (1 + tolerance):
+                regressions.append(f"{size} {stage}: {result['peak_mb']:.1f} MB, baseline {expected['peak_mb']:.1f} MB")
+    return regressions
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the extract and database stages on generated NAPLAN files.")
+    parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small", "medium"], help="The sizes to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of timed runs of each stage")
+    parser.add_argument("--seed", type=int, default=0, help="The seed for the generated files")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_FILE, help="The baseline results file")
+    parser.add_argument("--save-baseline", action="store_true", help="Save these results as the new baseline instead of comparing")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="How much slower or bigger a stage can be than the baseline")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+
+    results = {}
+    for size in args.sizes:
+        print(f"Benchmarking {size} ({SIZES[size]} students)")
+        results[size] = run_benchmark(SIZES[size], args.seed, args.repeat)
+        for stage, result in results[size].items():
+            print(f"    {stage:<28} {result['seconds']:>9.3f}s {result['peak_mb']:>9.1f} MB")
+
+    if args.save_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, "r") as baseline_file:
+                baseline = json.load(baseline_file)
+        baseline.update(results)
+        baseline["_environment"] = {"python": platform.python_version(), "platform": platform.platform(),
+                                    "json_backend": json_backend.select_backend()}
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(baseline, baseline_file, indent=4)
+        print(f"Saved baseline to '{args.baseline}'")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at '{args.baseline}', run with --save-baseline to create one")
+        return
+
+    with open(args.baseline, "r") as baseline_file:
+        baseline = json.load(baseline_file)
+
+    regressions = find_regressions(results, baseline, args.tolerance)
+    if regressions:
+        print(f"Found {len(regressions)} regressions against '{args.baseline}':")
+        for regression in regressions:
+            print(f"    {regression}")
+        sys.exit(1)
+
+    print(f"No regressions against '{args.baseline}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+import pandas as pd
+
+# Text columns with no more unique values than this share of their rows are stored as categoricals
+CATEGORY_MAX_UNIQUE_RATIO = 0.5
+
+
+def compact_column(column, category_max_unique_ratio=CATEGORY_MAX_UNIQUE_RATIO):
+    """
+    Store a column in the smallest dtype that holds exactly the same values.
+
+    Low-cardinality text becomes a categorical, booleans become real booleans, integers are
+    downcast to the smallest integer type and floats to float32 when no precision is lost.
+
+    Parameters:
+    column: pd.Series
+    The column to compact.
+
+    category_max_unique_ratio: float
+    The largest share of unique values a text column can have to be made categorical.
+
+    Returns:
+    pd.Series
+    The compacted column.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype) or pd.api.types.is_bool_dtype(column):
+        return column
+
+    if column.dtype == object or pd.api.types.is_string_dtype(column):
+        kind = pd.api.types.infer_dtype(column, skipna=True)
+        if kind == "boolean":
+            # Blank values need the nullable boolean dtype
+            return column.astype(bool) if column.notna().all() else column.astype("boolean")
+        if kind == "string" and column.nunique(dropna=True) <= len(column) * category_max_unique_ratio:
+            return column.astype("category")
+        return column
+
+    if pd.api.types.is_integer_dtype(column):
+        return pd.to_numeric(column, downcast="integer")
+
+    if pd.api.types.is_float_dtype(column):
+        # Only use float32 if every value survives the round trip unchanged
+        downcast = column.astype("float32")
+        if ((downcast.astype(column.dtype) == column) | column.isna()).all():
+            return downcast
+
+    return column
+
+
+def compact_dtypes(df, category_max_unique_ratio=CATEGORY_MAX_UNIQUE_RATIO):
+    """
+    Compact every column of a DataFrame, see compact_column.
+
+    Parameters:
+    df: pd.DataFrame
+    The DataFrame to compact.
+
+    category_max_unique_ratio: float
+    The largest share of unique values a text column can have to be made categorical.
+
+    Returns:
+    pd.DataFrame
+    The compacted DataFrame.
+    """
+    return pd.DataFrame({column: compact_column(df[column], category_max_unique_ratio) for column in df.columns}, index=df.index)
+
+
+def memory_usage(df):
+    """
+    Measure the memory used by a DataFrame, including the contents of text columns.
+
+    Parameters:
+    df: pd.DataFrame
+    The DataFrame to measure.
+
+    Returns:
+    int
+    The memory used in bytes.
+    """
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def print_memory_report(memory_before, memory_after):
+    """
+    Print the memory used by each table before and after compacting its dtypes.
+
+    Parameters:
+    memory_before: dict
+    The bytes used by each table before compacting, keyed by table name.
+
+    memory_after: dict
+    The bytes used by each table after compacting, keyed by table name.
+
+    Returns:
+    None
+    """
+    print("Memory used before and after compacting dtypes:")
+    for name, before in memory_before.items():
+        after = memory_after[name]
+        saved = 100 * (1 - after / before) if before else 0
+        print(f"    {name}: {before / 1024 / 1024:.1f} MB -> {after / 1024 / 1024:.1f} MB ({saved:.0f}% smaller)")
@@ -1,10 +1,23 @@
 import sqlite3
+from itertools import islice
 
 
 TABLE_PARAMETER = "{TABLE_PARAMETER}"
 DROP_TABLE_SQL = f"DROP TABLE {TABLE_PARAMETER};"
 GET_TABLES_SQL = "SELECT name FROM sqlite_schema WHERE type='table';"
 
+# The number of rows bound per executemany call when bulk loading
+DEFAULT_CHUNK_SIZE = 10000
+
+# Pragmas applied while bulk loading, the database can always be rebuilt from the raw data
+# so durability is traded for speed. A negative cache_size is in KiB.
+LOAD_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "OFF",
+    "cache_size": -262144,
+    "temp_store": "MEMORY",
+}
+
 
 def delete_all_tables(con):
     tables = get_tables(con)
@@ -31,6 +44,366 @@ def delete_tables(con, tables):
     cur.close()
 
 
+# The version of the tables created by create_tables, kept in the database's user_version so a
+# database created by an older version is rebuilt rather than loaded into
+SCHEMA_VERSION = 3
+
+# The tables whose rows belong to a single raw file, they are replaced whenever that file is loaded again.
+# The proficiency cut points differ from one year's export to the next, so each file keeps its own.
+FILE_TABLES = ["proficiency_score_cut_off_points", "questions", "student_scores", "attempts", "writing_responses"]
+
+# The tables whose rows are shared between files, with their columns. Each file's rows are kept in
+# file_<table> and the shared table is rebuilt from them once a load has finished, the row of a key
+# coming from the last file that has it, so an incremental load gives the same rows as a full one
+# and a row is gone once no loaded file has it.
+SHARED_TABLES = {
+    "domains": ["domainId", "domainName", "isWritingTask"],
+    "subdomains": ["domain", "title", "domainId"],
+    "naplan_students": ["studentId", "studentLOTE", "schoolStudentId"],
+}
+
+# The natural key of each table, rows with the same key are updated in place when upserting. The
+# rows of the FILE_TABLES are keyed by their sourceFile as well, so files that share a question, cut
+# point or student each keep their own rows and removing one file never removes another file's rows.
+# The year of a cut point is the test level it applies to.
+NATURAL_KEYS = {
+    "domains": ["domainId"],
+    "subdomains": ["domainId", "title"],
+    "proficiency_score_cut_off_points": ["sourceFile", "domainId", "year", "level"],
+    "questions": ["sourceFile", "questionId"],
+    "naplan_students": ["studentId"],
+    "writing_marking_scheme": ["markingSchemeId", "testLevel", "scoreD"],
+    "student_scores": ["sourceFile", "studentId", "domainId", "year"],
+    "attempts": ["sourceFile", "studentId", "questionId"],
+    "writing_responses": ["sourceFile", "studentId", "question_id", "markingSchemeId"],
+}
+
+# The unique indexes on the natural keys that aren't a primary key. The upserts of the rows shared
+# between files conflict on these, so they are created before loading. The keys of the FILE_TABLES
+# are only created once the rows have been bulk loaded, like the secondary indexes, as a file's
+# rows are deleted before it is loaded again and never conflict with the rows already there.
+SHARED_KEY_INDEXES = [
+    ("idx_subdomains_key", "subdomains", NATURAL_KEYS["subdomains"]),
+]
+
+FILE_KEY_INDEXES = [
+    ("idx_proficiency_score_cut_off_points_key", "proficiency_score_cut_off_points", NATURAL_KEYS["proficiency_score_cut_off_points"]),
+    ("idx_questions_key", "questions", NATURAL_KEYS["questions"]),
+    ("idx_student_scores_key", "student_scores", NATURAL_KEYS["student_scores"]),
+    ("idx_attempts_key", "attempts", NATURAL_KEYS["attempts"]),
+    ("idx_writing_responses_key", "writing_responses", NATURAL_KEYS["writing_responses"]),
+]
+
+DELETE_FILE_ROWS_SQL = f"DELETE FROM {TABLE_PARAMETER} WHERE sourceFile = ?;"
+
+# Rebuild a shared table from the file_ rows, keeping the row of each key from the file that comes last.
+# SQLite never treats keys with a NULL in them as the same, so those rows are all kept.
+REBUILD_SHARED_TABLE_SQL = """
+    INSERT INTO {table} ({columns})
+    SELECT {columns} FROM (
+        SELECT {columns}, o.position, f.rowid AS fileRow,
+            ROW_NUMBER() OVER (PARTITION BY {keys} ORDER BY o.position DESC, f.rowid DESC) AS latest
+        FROM file_{table} f
+        JOIN temp.file_order o ON o.sourceFile = f.sourceFile
+    )
+    WHERE latest = 1 OR {null_keys}
+    ORDER BY position, fileRow
+"""
+
+# Secondary indexes for the joins and lookups PowerBI and ad-hoc queries run. They are created
+# after the tables have been bulk loaded so the inserts don't have to keep them up to date. The
+# FILE_KEY_INDEXES start with the sourceFile, so they also serve deleting a file's rows.
+INDEXES = [
+    ("idx_questions_questionId", "questions", ["questionId"]),
+    ("idx_questions_questionIdentifier", "questions", ["questionIdentifier"]),
+    ("idx_questions_domainId", "questions", ["domainId"]),
+    ("idx_subdomains_domainId", "subdomains", ["domainId"]),
+    ("idx_proficiency_score_cut_off_points_domainId", "proficiency_score_cut_off_points", ["domainId", "year"]),
+    ("idx_student_scores_studentId", "student_scores", ["studentId"]),
+    ("idx_student_scores_domainId", "student_scores", ["domainId"]),
+    ("idx_attempts_studentId", "attempts", ["studentId"]),
+    ("idx_attempts_questionId", "attempts", ["questionId"]),
+    ("idx_writing_marking_scheme_questionId", "writing_marking_scheme", ["questionId"]),
+    ("idx_writing_responses_studentId", "writing_responses", ["studentId"]),
+    ("idx_writing_responses_question_id", "writing_responses", ["question_id"]),
+    ("idx_writing_responses_markingSchemeId", "writing_responses", ["markingSchemeId", "testLevel", "score"]),
+    ("idx_file_domains_sourceFile", "file_domains", ["sourceFile"]),
+    ("idx_file_subdomains_sourceFile", "file_subdomains", ["sourceFile"]),
+    ("idx_file_naplan_students_sourceFile", "file_naplan_students", ["sourceFile"]),
+]
+
+
+def apply_load_pragmas(conn, pragmas=LOAD_PRAGMAS):
+    """
+    Apply the pragmas used while bulk loading
+    
+    Parameters:
+    conn: sqlite3.Connection
+    The connection to the database
+    pragmas: dict
+    The pragma values keyed by pragma name
+        
+    Returns:
+    None
+    """
+    for name, value in pragmas.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+
+
+def bulk_insert(conn, sql, df, columns, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Insert the rows of a DataFrame in chunks of bound parameters, all in one transaction.
+    If a transaction is already open the rows are inserted as part of it and the caller commits.
+    
+    Parameters:
+    conn: sqlite3.Connection
+    The connection to the database
+    sql: str
+    The INSERT statement, with one parameter per column
+    df: pd.DataFrame
+    A DataFrame containing the rows to insert
+    columns: list
+    The DataFrame columns bound to the statement's parameters, in order
+    chunk_size: int
+    The number of rows bound per executemany call
+        
+    Returns:
+    None
+    """
+    rows = df[columns].itertuples(index=False, name=None)
+
+    # In autocommit mode the transaction has to be opened explicitly
+    owns_transaction = not conn.in_transaction
+    if owns_transaction and conn.isolation_level is None:
+        conn.execute("BEGIN")
+
+    try:
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            conn.executemany(sql, chunk)
+    except Exception:
+        if owns_transaction:
+            conn.rollback()
+        raise
+
+    if owns_transaction:
+        conn.commit()
+
+
+def upsert_clause(table, columns):
+    """
+    Build the ON CONFLICT clause that turns an INSERT into an upsert on the table's natural key
+    
+    Parameters:
+    table: str
+    The name of the table
+    columns: list
+    The columns being inserted
+        
+    Returns:
+    str
+    The ON CONFLICT clause
+    """
+    keys = NATURAL_KEYS[table]
+    updates = [f"{column} = excluded.{column}" for column in columns if column not in keys]
+    if not updates:
+        return f" ON CONFLICT ({', '.join(keys)}) DO NOTHING"
+    return f" ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {', '.join(updates)}"
+
+
+def get_loaded_files(conn):
+    """
+    Get the raw files that have been loaded into the database
+    
+    Parameters:
+    conn: sqlite3.Connection
+    The connection to the database
+        
+    Returns:
+    dict
+    The SHA-256 of each loaded file, keyed by file name
+    """
+    return dict(conn.execute("SELECT sourceFile, sha256 FROM loaded_files").fetchall())
+
+
+def delete_file_rows(conn, source_file):
+    """
+    Delete every row loaded from a raw file, the caller commits
+    
+    Parameters:
+    conn: sqlite3.Connection
+    The connection to the database
+    source_file: str
+    The name of the raw file
+        
+    Returns:
+    None
+    """
+    for table in FILE_TABLES + [f"file_{table}" for table in SHARED_TABLES]:
+        conn.execute(DELETE_FILE_ROWS_SQL.replace(TABLE_PARAMETER, table), (source_file,))
+    conn.execute("DELETE FROM loaded_files WHERE sourceFile = ?", (source_file,))
+
+
+def insert_file_shared_rows(conn, table, df, columns, source_file, chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Insert a file's rows of a table shared between files into its file_ table, the caller commits and rebuild_shared_tables builds the shared table from them
+    
+    Parameters:
+    conn: sqlite3.Connection
+    The connection to the database
+    table: str
+    The name of the shared table
+    df: pd.DataFrame
+    A DataFrame containing the file's rows
+    columns: list
+    The DataFrame columns holding each of the table's columns in SHARED_TABLES, in order
+    source_file: str
+    The name of the raw file
+    chunk_size: int
+    The number of rows bound per executemany call
+        
+    Returns:
+    None
+    """
+    file_columns = SHARED_TABLES[table] + ["sourceFile"]
+    sql = f"INSERT INTO file_{table} ({', '.join(file_columns)}) VALUES ({', '.join(['?'] * len(file_columns))})"
+    bulk_insert(conn, sql, df.assign(sourceFile=source_file), columns + ["sourceFile"], chunk_size)
+
+
+def rebuild_shared_tables(conn, files):
+    """
+    Rebuild the tables shared between files from the rows of the files that are loaded, in one transaction
+    
+    Parameters:
+    conn: sqlite3.Connection
+    The connection to the database
+    files: list
+    The names of the raw files in load order, where files share a key the row of the last one is kept
+        
+    Returns:
+    None
+    """
+    conn.execute("BEGIN")
+    try:
+        conn.execute("DROP TABLE IF EXISTS temp.file_order")
+        conn.execute("CREATE TEMP TABLE file_order (sourceFile TEXT PRIMARY KEY, position INTEGER)")
+        conn.executemany("INSERT INTO temp.file_order (sourceFile, position) VALUES (?, ?)", [(file, position) for position, file in enumerate(files)])
+        for table, columns in SHARED_TABLES.items():
+            keys = NATURAL_KEYS[table]
+            conn.execute(f"DELETE FROM {table}")
+            conn.execute(REBUILD_SHARED_TABLE_SQL.format(table=table, columns=", ".join(columns), keys=", ".join(keys),
+                                                         null_keys=" OR ".join(f"{key} IS NULL" for key in keys)))
+        conn.execute("DROP TABLE temp.file_order")
+    except Exception:
+        conn.rollback()
+        raise
+
+    conn.commit()
+
+
+def record_loaded_file(conn, source_file, sha256, year):
+    """
+    Record that a raw file has been loaded, the caller commits
+    
+    Parameters:
+    conn: sqlite3.Connection
+    The connection to the database
+    source_file: str
+    The name of the raw file
+    sha256: str
+    The SHA-256 of the raw file contents
+    year: int
+    The year the file is for
+        
+    Returns:
+    None
+    """
+    conn.execute("""
+        INSERT INTO loaded_files (sourceFile, sha256, year, loadedOn) VALUES (?, ?, ?, datetime('now'))
+        ON CONFLICT (sourceFile) DO UPDATE SET sha256 = excluded.sha256, year = excluded.year, loadedOn = excluded.loadedOn
+    """, (source_file, sha256, year))
+
+
+def create_indexes(conn, indexes=INDEXES, unique=False):
+    """
+    Create the secondary indexes, call this once the tables have been loaded
+    
+    Parameters:
+    conn: sqlite3.Connection
+    The connection to the database
+    indexes: list
+    The (index name, table, columns) of each index to create
+    unique: bool
+    Whether the indexes are unique
+        
+    Returns:
+    None
+    """
+    index_type = "UNIQUE INDEX" if unique else "INDEX"
+    for name, table, columns in indexes:
+        conn.execute(f"CREATE {index_type} IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+    conn.commit()
+
+
+def drop_indexes(conn, indexes=INDEXES):
+    """
+    Drop the secondary indexes, so loading into tables that already exist doesn't have to maintain them, finish_load creates them again
+    
+    Parameters:
+    conn: sqlite3.Connection
+    The connection to the database
+    indexes: list
+    The (index name, table, columns) of each index to drop
+        
+    Returns:
+    None
+    """
+    for name, _, _ in indexes:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.commit()
+
+
+def optimize_database(conn, analyze=True):
+    """
+    Gather statistics on the loaded tables and indexes so the query planner uses the indexes
+    
+    Parameters:
+    conn: sqlite3.Connection
+    The connection to the database
+    analyze: bool
+    Whether to analyze every table, otherwise SQLite only analyzes the tables that need it
+        
+    Returns:
+    None
+    """
+    if analyze:
+        conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+
+
+def finish_load(conn, indexes=INDEXES, analyze=True):
+    """
+    Create the natural key indexes of the file tables and the secondary indexes, and gather statistics once a bulk load has finished
+    
+    Parameters:
+    conn: sqlite3.Connection
+    The connection to the database
+    indexes: list
+    The (index name, table, columns) of each index to create
+    analyze: bool
+    Whether to analyze every table, otherwise SQLite only analyzes the tables that need it
+        
+    Returns:
+    None
+    """
+    create_indexes(conn, FILE_KEY_INDEXES, unique=True)
+    create_indexes(conn, indexes)
+    optimize_database(conn, analyze)
+
+
 def create_tables(conn):
 
     # Create the domains table
@@ -62,6 +435,7 @@ def create_tables(conn):
             scoreCutPoint REAL,
             year INTEGER,
             domainId TEXT,
+            sourceFile TEXT,
             FOREIGN KEY (domainId) REFERENCES domains(domainId)
     )
     """)
@@ -95,6 +469,8 @@ def create_tables(conn):
             attemptedPercentage REAL,
             parallelTestSection TEXT,
             locationInTestSection INTEGER,
+            year INTEGER,
+            sourceFile TEXT,
             FOREIGN KEY (domainId) REFERENCES domains(domainId)
         )
     """)
@@ -108,6 +484,34 @@ def create_tables(conn):
         )
     """)
 
+    # Create the file_ tables, these hold each file's rows of the tables shared between files
+    conn.execute("""
+        CREATE TABLE file_domains (
+            domainId TEXT,
+            domainName TEXT,
+            isWritingTask BOOLEAN,
+            sourceFile TEXT
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE file_subdomains (
+            domain TEXT,
+            title TEXT,
+            domainId TEXT,
+            sourceFile TEXT
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE file_naplan_students (
+            studentId TEXT,
+            studentLOTE TEXT,
+            schoolStudentId TEXT,
+            sourceFile TEXT
+        )
+    """)
+
     # Create writing_marking_scheme table
     conn.execute("""
         CREATE TABLE writing_marking_scheme (
@@ -135,6 +539,8 @@ def create_tables(conn):
             possibleRawScore REAL,
             studentRawScore REAL,
             scaledScore REAL,
+            year INTEGER,
+            sourceFile TEXT,
             FOREIGN KEY (domainId) REFERENCES domains(domainId),
             FOREIGN KEY (studentId) REFERENCES students(studentId)
         )
@@ -151,6 +557,8 @@ def create_tables(conn):
             questionNo INTEGER,
             parallelTestSection TEXT,
             node TEXT,
+            year INTEGER,
+            sourceFile TEXT,
             FOREIGN KEY (questionId) REFERENCES questions(questionId),
             FOREIGN KEY (studentId) REFERENCES students(studentId)
         )
@@ -166,16 +574,29 @@ def create_tables(conn):
             markingSchemeId TEXT,
             score INTEGER,
             testLevel INTERGER,
+            year INTEGER,
+            sourceFile TEXT,
             FOREIGN KEY (question_id) REFERENCES questions(id),
             FOREIGN KEY (studentId) REFERENCES students(studentId),
             FOREIGN KEY (score, testLevel, markingSchemeId) REFERENCES writing_marking_scheme(markingSchemeId, testLevel, scoreD)
         )
     """)
 
+    # Create the loaded_files table, this records which version of each raw file the database holds
+    conn.execute("""
+        CREATE TABLE loaded_files (
+            sourceFile TEXT PRIMARY KEY,
+            sha256 TEXT,
+            year INTEGER,
+            loadedOn TEXT
+        )
+    """)
+
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
     conn.commit()
 
 
-def insert_domains(conn, domains_df):
+def insert_domains(conn, domains_df, chunk_size=DEFAULT_CHUNK_SIZE, upsert=False):
     """
     Insert the domains into the domains table
     
@@ -184,18 +605,23 @@ def insert_domains(conn, domains_df):
     The connection to the database
     domains_df: pd.DataFrame
     A DataFrame containing the domain information
+    chunk_size: int
+    The number of rows bound per executemany call
+    upsert: bool
+    Whether to update rows that already exist with the same natural key instead of inserting duplicates
         
     Returns:
     None
     """
-    for _, row in domains_df.iterrows():
-        conn.execute("""
-            INSERT INTO domains (domainId, domainName, isWritingTask) VALUES (?, ?, ?)
-        """, (row["domainId"], row["domainName"], row["isWritingTask"]))
-    conn.commit()
+    sql = """
+        INSERT INTO domains (domainId, domainName, isWritingTask) VALUES (?, ?, ?)
+    """
+    if upsert:
+        sql += upsert_clause("domains", ["domainId", "domainName", "isWritingTask"])
+    bulk_insert(conn, sql, domains_df, ["domainId", "domainName", "isWritingTask"], chunk_size)
 
 
-def insert_subdomains(conn, subdomains_df):
+def insert_subdomains(conn, subdomains_df, chunk_size=DEFAULT_CHUNK_SIZE, upsert=False):
     """
     Insert the subdomains into the subdomains table
     
@@ -204,18 +630,23 @@ def insert_subdomains(conn, subdomains_df):
     The connection to the database
     subdomains_df: pd.DataFrame
     A DataFrame containing the subdomain information
+    chunk_size: int
+    The number of rows bound per executemany call
+    upsert: bool
+    Whether to update rows that already exist with the same natural key instead of inserting duplicates
         
     Returns:
     None
     """
-    for _, row in subdomains_df.iterrows():
-        conn.execute("""
-            INSERT INTO subdomains (domain, title, domainId) VALUES (?, ?, ?)
-        """, (row["domain"], row["title"], row["domainId"]))
-    conn.commit()
+    sql = """
+        INSERT INTO subdomains (domain, title, domainId) VALUES (?, ?, ?)
+    """
+    if upsert:
+        sql += upsert_clause("subdomains", ["domain", "title", "domainId"])
+    bulk_insert(conn, sql, subdomains_df, ["domain", "title", "domainId"], chunk_size)
 
 
-def insert_proficiency_score_cut_off_points(conn, proficiency_score_cut_off_points_df):
+def insert_proficiency_score_cut_off_points(conn, proficiency_score_cut_off_points_df, chunk_size=DEFAULT_CHUNK_SIZE, upsert=False):
     """
     Insert the proficiency score cut off points into the proficiency_score_cut_off_points table
     
@@ -224,18 +655,23 @@ def insert_proficiency_score_cut_off_points(conn, proficiency_score_cut_off_poin
     The connection to the database
     proficiency_score_cut_off_points_df: pd.DataFrame
     A DataFrame containing the proficiency score cut off points information
+    chunk_size: int
+    The number of rows bound per executemany call
+    upsert: bool
+    Whether to update rows that already exist with the same natural key instead of inserting duplicates
         
     Returns:
     None
     """
-    for _, row in proficiency_score_cut_off_points_df.iterrows():
-        conn.execute("""
-            INSERT INTO proficiency_score_cut_off_points (level, startPoint, scoreCutPoint, year, domainId) VALUES (?, ?, ?, ?, ?)
-        """, (row["level"], row["startPoint"], row["scoreCutPoint"], row["year"], row["domainId"]))
-    conn.commit()
+    sql = """
+        INSERT INTO proficiency_score_cut_off_points (level, startPoint, scoreCutPoint, year, domainId, sourceFile) VALUES (?, ?, ?, ?, ?, ?)
+    """
+    if upsert:
+        sql += upsert_clause("proficiency_score_cut_off_points", ["level", "startPoint", "scoreCutPoint", "year", "domainId", "sourceFile"])
+    bulk_insert(conn, sql, proficiency_score_cut_off_points_df, ["level", "startPoint", "scoreCutPoint", "year", "domainId", "sourceFile"], chunk_size)
 
 
-def insert_questions(conn, questions_df):
+def insert_questions(conn, questions_df, chunk_size=DEFAULT_CHUNK_SIZE, upsert=False):
     """
     Insert the questions into the questions table
     
@@ -244,70 +680,107 @@ def insert_questions(conn, questions_df):
     The connection to the database
     questions_df: pd.DataFrame
     A DataFrame containing the question information
+    chunk_size: int
+    The number of rows bound per executemany call
+    upsert: bool
+    Whether to update rows that already exist with the same natural key instead of inserting duplicates
         
     Returns:
     None
     """
-    for _, row in questions_df.iterrows():
-        conn.execute("""
-            INSERT INTO questions (
-                    questionId,
-                    eventIdentifier,
-                    questionIdentifier,
-                    nodeIdentifier,
-                    descriptor,
-                    domain,
-                    domainId,
-                    subdomain,
-                    subdomainAbbr,
-                    subdomain3,
-                    curriculumContentCode,
-                    curriculumContentUrl,
-                    exemplarItem,
-                    testLevel,
-                    difficulty,
-                    proficiencyLevel,
-                    attempts,
-                    correct,
-                    incorrect,
-                    notAttempted,
-                    correctPercentage,
-                    domainAndYearLevelAttempts,
-                    attemptedPercentage,
-                    parallelTestSection,
-                    locationInTestSection)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                     """
-                     , (row["questionId"],
-                        row["eventIdentifier"],
-                        row["questionIdentifier"],
-                        row["nodeIdentifier"],
-                        row["descriptor"],
-                        row["domain"],
-                        row["domainId"],
-                        row["subdomain"],
-                        row["subdomainAbbr"],
-                        row["subdomain3"],
-                        row["curriculumContentCode"],
-                        row["curriculumContentUrl"],
-                        row["exemplarItem"],
-                        row["testLevel"],
-                        row["difficulty"],
-                        row["proficiencyLevel"],
-                        row["attempts"],
-                        row["correct"],
-                        row["incorrect"],
-                        row["notAttempted"],
-                        row["correctPercentage"],
-                        row["domainAndYearLevelAttempts"],
-                        row["attemptedPercentage"],
-                        row["parallelTestSection"],
-                        row["locationInTestSection"])
-        )
-    conn.commit()
-
-
-def insert_students(conn, students_df):
+    sql = """
+        INSERT INTO questions (
+                questionId,
+                eventIdentifier,
+                questionIdentifier,
+                nodeIdentifier,
+                descriptor,
+                domain,
+                domainId,
+                subdomain,
+                subdomainAbbr,
+                subdomain3,
+                curriculumContentCode,
+                curriculumContentUrl,
+                exemplarItem,
+                testLevel,
+                difficulty,
+                proficiencyLevel,
+                attempts,
+                correct,
+                incorrect,
+                notAttempted,
+                correctPercentage,
+                domainAndYearLevelAttempts,
+                attemptedPercentage,
+                parallelTestSection,
+                locationInTestSection,
+                year,
+                sourceFile)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    if upsert:
+        sql += upsert_clause("questions", [
+        "questionId",
+        "eventIdentifier",
+        "questionIdentifier",
+        "nodeIdentifier",
+        "descriptor",
+        "domain",
+        "domainId",
+        "subdomain",
+        "subdomainAbbr",
+        "subdomain3",
+        "curriculumContentCode",
+        "curriculumContentUrl",
+        "exemplarItem",
+        "testLevel",
+        "difficulty",
+        "proficiencyLevel",
+        "attempts",
+        "correct",
+        "incorrect",
+        "notAttempted",
+        "correctPercentage",
+        "domainAndYearLevelAttempts",
+        "attemptedPercentage",
+        "parallelTestSection",
+        "locationInTestSection",
+        "year",
+        "sourceFile"
+    ])
+    bulk_insert(conn, sql, questions_df, [
+        "questionId",
+        "eventIdentifier",
+        "questionIdentifier",
+        "nodeIdentifier",
+        "descriptor",
+        "domain",
+        "domainId",
+        "subdomain",
+        "subdomainAbbr",
+        "subdomain3",
+        "curriculumContentCode",
+        "curriculumContentUrl",
+        "exemplarItem",
+        "testLevel",
+        "difficulty",
+        "proficiencyLevel",
+        "attempts",
+        "correct",
+        "incorrect",
+        "notAttempted",
+        "correctPercentage",
+        "domainAndYearLevelAttempts",
+        "attemptedPercentage",
+        "parallelTestSection",
+        "locationInTestSection",
+        "year",
+        "sourceFile"
+    ], chunk_size)
+
+
+def insert_students(conn, students_df, chunk_size=DEFAULT_CHUNK_SIZE, upsert=False):
     """
     Insert the students into the naplan_students table
     
@@ -316,18 +789,23 @@ def insert_students(conn, students_df):
     The connection to the database
     students_df: pd.DataFrame
     A DataFrame containing the student information
+    chunk_size: int
+    The number of rows bound per executemany call
+    upsert: bool
+    Whether to update rows that already exist with the same natural key instead of inserting duplicates
         
     Returns:
     None
     """
-    for _, row in students_df.iterrows():
-        conn.execute("""
-            INSERT INTO naplan_students (studentId, studentLOTE, schoolStudentId) VALUES (?, ?, ?)
-        """, (row["student.studentId"], row["student.metadata.studentLOTE"], row["student.metadata.schoolStudentId"]))
-    conn.commit()
+    sql = """
+        INSERT INTO naplan_students (studentId, studentLOTE, schoolStudentId) VALUES (?, ?, ?)
+    """
+    if upsert:
+        sql += upsert_clause("naplan_students", ["studentId", "studentLOTE", "schoolStudentId"])
+    bulk_insert(conn, sql, students_df, ["student.studentId", "student.metadata.studentLOTE", "student.metadata.schoolStudentId"], chunk_size)
 
 
-def insert_students_scores(conn, student_scores_df):
+def insert_students_scores(conn, student_scores_df, chunk_size=DEFAULT_CHUNK_SIZE, upsert=False):
     """
     Insert the student scores into the student_scores table
     
@@ -336,18 +814,23 @@ def insert_students_scores(conn, student_scores_df):
     The connection to the database
     student_scores_df: pd.DataFrame
     A DataFrame containing the student scores information
+    chunk_size: int
+    The number of rows bound per executemany call
+    upsert: bool
+    Whether to update rows that already exist with the same natural key instead of inserting duplicates
         
     Returns:
     None
     """
-    for _, row in student_scores_df.iterrows():
-        conn.execute("""
-            INSERT INTO student_scores (studentId, domainId, possibleRawScore, studentRawScore, scaledScore) VALUES (?, ?, ?, ?, ?)
-        """, (row["student.studentId"], row["domain.domainId"], row["possibleRawScore"], row["studentRawScore"], row["scaledScore"]))
-    conn.commit()
+    sql = """
+        INSERT INTO student_scores (studentId, domainId, possibleRawScore, studentRawScore, scaledScore, year, sourceFile) VALUES (?, ?, ?, ?, ?, ?, ?)
+    """
+    if upsert:
+        sql += upsert_clause("student_scores", ["studentId", "domainId", "possibleRawScore", "studentRawScore", "scaledScore", "year", "sourceFile"])
+    bulk_insert(conn, sql, student_scores_df, ["student.studentId", "domain.domainId", "possibleRawScore", "studentRawScore", "scaledScore", "year", "sourceFile"], chunk_size)
 
 
-def insert_attempts(conn, attempts_df):
+def insert_attempts(conn, attempts_df, chunk_size=DEFAULT_CHUNK_SIZE, upsert=False):
     """
     Insert the attempts into the attempts table
     
@@ -356,18 +839,23 @@ def insert_attempts(conn, attempts_df):
     The connection to the database
     attempts_df: pd.DataFrame
     A DataFrame containing the attempts information
+    chunk_size: int
+    The number of rows bound per executemany call
+    upsert: bool
+    Whether to update rows that already exist with the same natural key instead of inserting duplicates
         
     Returns:
     None
     """
-    for _, row in attempts_df.iterrows():
-        conn.execute("""
-            INSERT INTO attempts (studentId, correct, answeredOn, questionId, questionNo, parallelTestSection, node) VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (row["student.studentId"], row["correct"], row["answeredOn"], row["questionId"], row["questionNo"], row["parallelTestSection"], row["node"]))
-    conn.commit()
+    sql = """
+        INSERT INTO attempts (studentId, correct, answeredOn, questionId, questionNo, parallelTestSection, node, year, sourceFile) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    if upsert:
+        sql += upsert_clause("attempts", ["studentId", "correct", "answeredOn", "questionId", "questionNo", "parallelTestSection", "node", "year", "sourceFile"])
+    bulk_insert(conn, sql, attempts_df, ["student.studentId", "correct", "answeredOn", "questionId", "questionNo", "parallelTestSection", "node", "year", "sourceFile"], chunk_size)
 
 
-def insert_writing_marking_scheme(conn, writing_marking_scheme_df):
+def insert_writing_marking_scheme(conn, writing_marking_scheme_df, chunk_size=DEFAULT_CHUNK_SIZE, upsert=False):
     """
     Insert the writing marking scheme into the writing_marking_scheme table
     
@@ -376,18 +864,23 @@ def insert_writing_marking_scheme(conn, writing_marking_scheme_df):
     The connection to the database
     writing_marking_scheme_df: pd.DataFrame
     A DataFrame containing the writing marking scheme information
+    chunk_size: int
+    The number of rows bound per executemany call
+    upsert: bool
+    Whether to update rows that already exist with the same natural key instead of inserting duplicates
         
     Returns:
     None
     """
-    for _, row in writing_marking_scheme_df.iterrows():
-        conn.execute("""
-            INSERT INTO writing_marking_scheme (questionId, markingSchemeId, name, description, domainId, testLevel, proficiency, scoreD, sDescription) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (row["questionId"], row["id"], row["name"], row["description"], row["domainId"], row["testLevel"], row["proficiencyLevel"],row["scoreD"], row["sDescription"]))
-    conn.commit()
+    sql = """
+        INSERT INTO writing_marking_scheme (questionId, markingSchemeId, name, description, domainId, testLevel, proficiency, scoreD, sDescription) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    if upsert:
+        sql += upsert_clause("writing_marking_scheme", ["questionId", "markingSchemeId", "name", "description", "domainId", "testLevel", "proficiency", "scoreD", "sDescription"])
+    bulk_insert(conn, sql, writing_marking_scheme_df, ["questionId", "id", "name", "description", "domainId", "testLevel", "proficiencyLevel", "scoreD", "sDescription"], chunk_size)
 
 
-def insert_writing_responses(conn, writing_responses_df):
+def insert_writing_responses(conn, writing_responses_df, chunk_size=DEFAULT_CHUNK_SIZE, upsert=False):
     """
     Insert the writing responses into the writing_responses table
     
@@ -396,12 +889,17 @@ def insert_writing_responses(conn, writing_responses_df):
     The connection to the database
     writing_responses_df: pd.DataFrame
     A DataFrame containing the writing responses information
+    chunk_size: int
+    The number of rows bound per executemany call
+    upsert: bool
+    Whether to update rows that already exist with the same natural key instead of inserting duplicates
         
     Returns:
     None
     """
-    for _, row in writing_responses_df.iterrows():
-        conn.execute("""
-            INSERT INTO writing_responses (studentId, writingRespose, question_id, markingSchemeId, score, testLevel) VALUES (?, ?, ?, ?, ?, ?)
-        """, (row["student.studentId"], row["writingResponse"], row["questionId"], row["rowguid"], row["effectiveScore"], row["student.testLevel"]))
-    conn.commit()
\ No newline at end of file
+    sql = """
+        INSERT INTO writing_responses (studentId, writingRespose, question_id, markingSchemeId, score, testLevel, year, sourceFile) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """
+    if upsert:
+        sql += upsert_clause("writing_responses", ["studentId", "writingRespose", "question_id", "markingSchemeId", "score", "testLevel", "year", "sourceFile"])
+    bulk_insert(conn, sql, writing_responses_df, ["student.studentId", "writingResponse", "questionId", "rowguid", "effectiveScore", "student.testLevel", "year", "sourceFile"], chunk_size)
@@ -0,0 +1,483 @@
+import raw_sources
+import sqlite3
+import database_interaction
+import extract_data
+from table_specs import compile_spec
+from run_report import RunReport
+
+# The columns of the questions table that come from the raw questions
+QUESTION_COLUMNS = [
+    "questionId",
+    "eventIdentifier",
+    "questionIdentifier",
+    "nodeIdentifier",
+    "descriptor",
+    "domain",
+    "domainId",
+    "subdomain",
+    "subdomainAbbr",
+    "subdomain3",
+    "curriculumContentCode",
+    "curriculumContentUrl",
+    "exemplarItem",
+    "testLevel",
+    "difficulty",
+    "proficiencyLevel",
+    "attempts",
+    "correct",
+    "incorrect",
+    "notAttempted",
+    "correctPercentage",
+    "domainAndYearLevelAttempts",
+    "attemptedPercentage",
+    "parallelTestSection",
+    "locationInTestSection"
+]
+
+
+# The answer rows of the attempts and writing_responses tables, built in the same pass over the
+# attempt records as the students and student scores
+ATTEMPT_ROWS_SPEC = {
+    "name": "attempts",
+    "source": "attempt_records",
+    "columns": ["student.studentId"],
+    "filters": ["student.studentId"],
+    "explode": [
+        {"path": "answers", "drop": ["writingResponse", "markingSchemeComponents"]},
+    ],
+    "row_filters": ["questionId"],
+    "tables": extract_data.STUDENT_TABLES,
+}
+
+WRITING_RESPONSE_ROWS_SPEC = {
+    "name": "writing_responses",
+    "source": "writing_attempt_records",
+    "columns": ["student.studentId", "student.testLevel"],
+    "filters": ["student.studentId"],
+    # Unmarked tests have no marking scheme components
+    "explode": [
+        {"path": "answers"},
+        {"path": "markingSchemeComponents"},
+    ],
+    "tables": extract_data.STUDENT_TABLES,
+}
+
+extract_attempt_rows = compile_spec(ATTEMPT_ROWS_SPEC)
+extract_writing_response_rows = compile_spec(WRITING_RESPONSE_ROWS_SPEC)
+
+# The tables built for the database from each raw file, they are kept alongside the extracted
+# tables of the file with DATABASE_TABLE_PREFIX in front of their names
+DATABASE_TABLES = [
+    "domains",
+    "subdomains",
+    "proficiency_score_cut_off_points",
+    "questions",
+    "naplan_students",
+    "student_scores",
+    "attempts",
+    "writing_responses",
+]
+DATABASE_TABLE_PREFIX = "database_"
+DATABASE_TABLE_KEYS = [DATABASE_TABLE_PREFIX + name for name in DATABASE_TABLES]
+
+# The columns of each shared table's rows that hold its columns in database_interaction.SHARED_TABLES
+SHARED_TABLE_COLUMNS = {
+    "domains": ["domainId", "domainName", "isWritingTask"],
+    "subdomains": ["domain", "title", "domainId"],
+    "naplan_students": ["student.studentId", "student.metadata.studentLOTE", "student.metadata.schoolStudentId"],
+}
+
+# The columns of each file table's rows that hold its natural key, see database_interaction.NATURAL_KEYS
+FILE_TABLE_KEY_COLUMNS = {
+    "proficiency_score_cut_off_points": ["sourceFile", "domainId", "year", "level"],
+    "questions": ["sourceFile", "questionId"],
+    "student_scores": ["sourceFile", "student.studentId", "domain.domainId", "year"],
+    "attempts": ["sourceFile", "student.studentId", "questionId"],
+    "writing_responses": ["sourceFile", "student.studentId", "questionId", "rowguid"],
+}
+
+
+def file_year(year):
+    """
+    Convert the year taken from a file name to a number where possible.
+
+    Parameters:
+    year: str
+    The year taken from the file name.
+
+    Returns:
+    int or str
+    The year.
+    """
+    return int(year) if str(year).isdigit() else year
+
+
+def drop_duplicate_keys(df, key_columns):
+    """
+    Drop the rows that repeat the natural key of a later row, keeping the last as an upsert would.
+
+    Parameters:
+    df: pd.DataFrame
+    The rows of a table.
+
+    key_columns: list
+    The columns holding the table's natural key.
+
+    Returns:
+    pd.DataFrame
+    The rows with one row per natural key.
+    """
+    # SQLite never treats rows with a NULL in their key as the same, so they are all kept
+    has_key = df[key_columns].notna().all(axis=1)
+    return df[~(has_key & df.duplicated(subset=key_columns, keep="last"))]
+
+
+def build_database_tables(document, year, source_file):
+    """
+    Build the rows for each table in the database from a parsed NAPLAN file.
+
+    Parameters:
+    document: extract_data.ParsedDocument
+    The parsed NAPLAN file.
+
+    year: str
+    The year the file is for.
+
+    source_file: str
+    The name of the raw file, stored against the rows that belong to it.
+
+    Returns:
+    dict
+    The DataFrames for each table, keyed by table name.
+    """
+    year = file_year(year)
+
+    domains = document.domains.reindex(columns=["domainId", "domainName", "isWritingTask"])
+    domain_ids = dict(zip(domains["domainName"], domains["domainId"]))
+
+    # Fill in the domainId from the domain name where the question doesn't have one
+    questions = document.questions.reindex(columns=QUESTION_COLUMNS)
+    questions["domainId"] = questions["domainId"].fillna(questions["domain"].map(domain_ids))
+    questions["year"] = year
+    questions["sourceFile"] = source_file
+
+    subdomains = questions[["domain", "subdomain", "domainId"]].rename(columns={"subdomain": "title"})
+    subdomains = subdomains.dropna(subset=["title"]).drop_duplicates()
+
+    # The cut points are for the year of the file, a later year's export can move them
+    proficiency = extract_data.extract_proficiency(document)
+    proficiency["sourceFile"] = source_file
+
+    # One row per answer for the non-writing attempts and one per marking scheme component for the
+    # writing attempts, the students and their scores come from the same pass over each
+    attempt_tables = extract_attempt_rows(document)
+    writing_tables = extract_writing_response_rows(document)
+
+    student_tables = extract_data.combine_student_tables([attempt_tables, writing_tables])
+    students = student_tables["naplan_students"]
+
+    student_scores = student_tables["student_scores"]
+    student_scores["year"] = year
+    student_scores["sourceFile"] = source_file
+
+    attempts = attempt_tables["attempts"].reindex(columns=["student.studentId", "correct", "answeredOn", "questionId", "questionNo", "parallelTestSection", "node"])
+    attempts["year"] = year
+    attempts["sourceFile"] = source_file
+
+    writing_responses = writing_tables["writing_responses"].reindex(columns=["student.studentId", "writingResponse", "questionId", "rowguid", "effectiveScore", "student.testLevel"])
+    writing_responses["year"] = year
+    writing_responses["sourceFile"] = source_file
+
+    return {
+        "domains": domains.dropna(subset=["domainId"]),
+        "subdomains": subdomains,
+        "proficiency_score_cut_off_points": proficiency,
+        "questions": questions,
+        "naplan_students": students,
+        "student_scores": student_scores,
+        "attempts": attempts,
+        "writing_responses": writing_responses,
+    }
+
+
+def pop_database_tables(file_tables):
+    """
+    Take the database tables out of the tables extracted from a raw file.
+
+    Parameters:
+    file_tables: dict
+    The DataFrames extracted from the file, keyed by table name.
+
+    Returns:
+    dict
+    The DataFrames for each table in the database keyed by table name, empty if they weren't built for the file.
+    """
+    return {name: file_tables.pop(DATABASE_TABLE_PREFIX + name) for name in DATABASE_TABLES
+            if DATABASE_TABLE_PREFIX + name in file_tables}
+
+
+def load_file(conn, tables, source_file, sha256, year, chunk_size=database_interaction.DEFAULT_CHUNK_SIZE, replace=True):
+    """
+    Replace the rows loaded from a raw file with its current rows, in a single transaction.
+
+    The rows that belong to the file are deleted and its new rows inserted, each file keeps its
+    own rows even where files share a question or student. The file's rows of the tables shared
+    between files, such as domains and students, go into their file_ tables, the shared tables are
+    rebuilt from them with database_interaction.rebuild_shared_tables once the load has finished.
+
+    Parameters:
+    conn: sqlite3.Connection
+    The connection to the database.
+
+    tables: dict
+    The DataFrames for each table from build_database_tables.
+
+    source_file: str
+    The name of the raw file.
+
+    sha256: str
+    The SHA-256 of the raw file contents.
+
+    year: int
+    The year the file is for.
+
+    chunk_size: int
+    The number of rows bound per executemany call.
+
+    replace: bool
+    Whether to delete the rows previously loaded from the file, False when they have already been deleted.
+
+    Returns:
+    None
+    """
+    conn.execute("BEGIN")
+    try:
+        if replace:
+            database_interaction.delete_file_rows(conn, source_file)
+        for table, columns in SHARED_TABLE_COLUMNS.items():
+            database_interaction.insert_file_shared_rows(conn, table, tables[table], columns, source_file, chunk_size)
+
+        # The file's rows were deleted, so only a key repeated within the file can clash
+        file_tables = {table: drop_duplicate_keys(tables[table], FILE_TABLE_KEY_COLUMNS[table]) for table in database_interaction.FILE_TABLES}
+        database_interaction.insert_proficiency_score_cut_off_points(conn, file_tables["proficiency_score_cut_off_points"], chunk_size)
+        database_interaction.insert_questions(conn, file_tables["questions"], chunk_size)
+        database_interaction.insert_students_scores(conn, file_tables["student_scores"], chunk_size)
+        database_interaction.insert_attempts(conn, file_tables["attempts"], chunk_size)
+        database_interaction.insert_writing_responses(conn, file_tables["writing_responses"], chunk_size)
+        database_interaction.record_loaded_file(conn, source_file, sha256, year)
+    except Exception:
+        conn.rollback()
+        raise
+
+    conn.commit()
+
+
+def remove_file(conn, source_file):
+    """
+    Remove the rows loaded from a raw file that is no longer in the raw data.
+
+    Parameters:
+    conn: sqlite3.Connection
+    The connection to the database.
+
+    source_file: str
+    The name of the raw file.
+
+    Returns:
+    None
+    """
+    conn.execute("BEGIN")
+    try:
+        database_interaction.delete_file_rows(conn, source_file)
+    except Exception:
+        conn.rollback()
+        raise
+
+    conn.commit()
+
+
+class DatabaseLoader:
+    """
+    Load the raw NAPLAN files into the SQLite database one file at a time, as they are extracted.
+
+    A full load drops and recreates every table. An incremental load keeps the existing tables
+    and only replaces the rows of files that are new or have changed since they were last loaded.
+    The rows of files that are no longer in the raw data or have changed are removed as soon as the
+    loader is created. The files that still need loading are in pending, each is loaded with the
+    tables built from it and finish is called once they have all been loaded, or close if the load
+    stops. A file whose load didn't finish has no rows or loaded_files entry, so the next
+    incremental load loads it again.
+
+    Parameters:
+    database_path: str
+    The path of the SQLite database file.
+
+    files: list
+    The names of the raw files.
+
+    sources: list
+    The RawSource of each raw file.
+
+    incremental: bool
+    Whether to only load new or changed files.
+
+    chunk_size: int
+    The number of rows bound per executemany call.
+    """
+    def __init__(self, database_path, files, sources, incremental=False, chunk_size=database_interaction.DEFAULT_CHUNK_SIZE):
+        self.files = files
+        self.chunk_size = chunk_size
+        self.finished = False
+        self.conn = sqlite3.connect(database_path)
+        database_interaction.apply_load_pragmas(self.conn)
+
+        # A database without loaded_files predates incremental loading, and one with a different
+        # schema version was created by another version of the tables, both are rebuilt
+        existing_tables = [table for table, in database_interaction.get_tables(self.conn)]
+        schema_version = self.conn.execute("PRAGMA user_version").fetchone()[0]
+        if incremental and "loaded_files" in existing_tables and schema_version == database_interaction.SCHEMA_VERSION:
+            loaded_files = database_interaction.get_loaded_files(self.conn)
+        else:
+            database_interaction.delete_all_tables(self.conn)
+            database_interaction.create_tables(self.conn)
+            database_interaction.create_indexes(self.conn, database_interaction.SHARED_KEY_INDEXES, unique=True)
+            loaded_files = {}
+
+        # An incremental load only touches a few files so SQLite decides which tables are worth analyzing again
+        self.analyze = not loaded_files
+
+        for file in loaded_files:
+            if file not in files:
+                remove_file(self.conn, file)
+                print(f"Removed rows for deleted file from database: {file}")
+
+        # The members of a zip archive share the archive's hash, so it is only hashed once
+        hashes = {}
+        self.pending = {}
+        for file, source in zip(files, sources):
+            if source.path not in hashes:
+                hashes[source.path] = raw_sources.hash_file(source.path)
+            if loaded_files.get(file) == hashes[source.path]:
+                print(f"Database already up to date for file: {file}")
+                continue
+            self.pending[file] = hashes[source.path]
+
+        # Delete the old rows of the changed files while the sourceFile indexes can find them, then drop
+        # the indexes so the new rows are loaded without maintaining them, finish builds them again
+        if loaded_files and self.pending:
+            for file in self.pending:
+                if file in loaded_files:
+                    remove_file(self.conn, file)
+            database_interaction.drop_indexes(self.conn, database_interaction.FILE_KEY_INDEXES + database_interaction.INDEXES)
+
+    def load(self, file, year, tables):
+        """
+        Load the tables built from a raw file, replacing any rows previously loaded from it.
+
+        Parameters:
+        file: str
+        The name of the raw file, one of the pending files.
+
+        year: str
+        The year the file is for.
+
+        tables: dict
+        The DataFrames for each table from build_database_tables.
+
+        Returns:
+        None
+        """
+        load_file(self.conn, tables, file, self.pending.pop(file), file_year(year), self.chunk_size, replace=False)
+        print(f"Loaded file into database: {file}")
+
+    def finish(self):
+        """
+        Rebuild the tables shared between files, build the indexes once the rows are in, refresh the
+        planner statistics and close the database.
+
+        Returns:
+        None
+        """
+        # The shared tables are rebuilt even when no file changed, in case an earlier load stopped before they were
+        database_interaction.rebuild_shared_tables(self.conn, self.files)
+        database_interaction.finish_load(self.conn, analyze=self.analyze)
+        self.finished = True
+        self.close()
+
+    def close(self):
+        """
+        Close the database, the rows of every file loaded so far are kept. If the load stopped before
+        finish, the shared tables are rebuilt and the indexes dropped for the load are built again
+        first, so the database is never left without them.
+
+        Returns:
+        None
+        """
+        try:
+            if not self.finished:
+                database_interaction.rebuild_shared_tables(self.conn, self.files)
+                database_interaction.create_indexes(self.conn, database_interaction.FILE_KEY_INDEXES, unique=True)
+                database_interaction.create_indexes(self.conn)
+                self.finished = True
+        finally:
+            self.conn.close()
+
+
+def load_database(database_path, files, sources, years, incremental=False, chunk_size=database_interaction.DEFAULT_CHUNK_SIZE, report=None,
+                  json_decoder=None):
+    """
+    Load the raw NAPLAN files into the SQLite database, decoding each file that needs loading.
+
+    A run that extracts the files as well hands the tables it built from each file to a
+    DatabaseLoader instead, so the files are only decoded once.
+
+    Parameters:
+    database_path: str
+    The path of the SQLite database file.
+
+    files: list
+    The names of the raw files.
+
+    sources: list
+    The RawSource of each raw file.
+
+    years: list
+    The year each file is for.
+
+    incremental: bool
+    Whether to only load new or changed files.
+
+    chunk_size: int
+    The number of rows bound per executemany call.
+
+    report: RunReport
+    The run report the load of each file is recorded in, None to not record them.
+
+    json_decoder: str
+    The JSON backend to decode the raw files with, None to use the fastest one installed.
+
+    Returns:
+    None
+    """
+    report = report or RunReport()
+
+    loader = DatabaseLoader(database_path, files, sources, incremental, chunk_size)
+    try:
+        for file, source, year in zip(files, sources, years):
+            if file not in loader.pending:
+                continue
+
+            with report.stage("database_build", file) as stage:
+                raw = raw_sources.load_json_source(source, json_decoder, stage)
+                document = extract_data.ParsedDocument(raw)
+                del raw
+                tables = build_database_tables(document, year, file)
+                stage["rows_out"] = sum(len(df) for df in tables.values())
+
+            with report.stage("database_insert", file, rows_in=stage["rows_out"]):
+                loader.load(file, year, tables)
+
+        with report.stage("database_finish"):
+            loader.finish()
+    finally:
+        loader.close()
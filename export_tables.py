@@ -0,0 +1,197 @@
+import os
+import shutil
+import tempfile
+import pandas as pd
+
+OUTPUT_FORMATS = ["csv", "parquet", "feather"]
+OUTPUT_FILE_PATH = "powerBI_import\\"
+
+# zstd gives much smaller files than the defaults for little extra write time
+COLUMNAR_COMPRESSION = "zstd"
+
+
+def check_output_format(output_format):
+    """
+    Check the libraries needed for an output format are installed.
+
+    Parameters:
+    output_format: str
+    One of OUTPUT_FORMATS.
+
+    Returns:
+    None
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {', '.join(OUTPUT_FORMATS)}")
+
+    if output_format != "csv":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError(f"Writing {output_format} files requires the pyarrow package, install it with 'pip install pyarrow'")
+
+
+def prepare_columnar(df):
+    """
+    Give every column a single type so it can be stored in a typed columnar file.
+
+    Object columns are converted to a proper dtype where possible, columns that still mix
+    types (such as numbers and text in the same column) are stored as text.
+
+    Parameters:
+    df: pd.DataFrame
+    The table to prepare.
+
+    Returns:
+    pd.DataFrame
+    The table with a single type per column.
+    """
+    df = df.infer_objects()
+    for column in df.columns[df.dtypes == object]:
+        if pd.api.types.infer_dtype(df[column], skipna=True) in ("mixed", "mixed-integer", "mixed-integer-float"):
+            df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+    return df
+
+
+def table_path(name, output_format, output_path=OUTPUT_FILE_PATH):
+    """
+    Work out the path a table is exported to.
+
+    Parameters:
+    name: str
+    The name of the table.
+
+    output_format: str
+    One of OUTPUT_FORMATS.
+
+    output_path: str
+    The directory the table is exported to.
+
+    Returns:
+    str
+    The path of the exported file.
+    """
+    return f"{output_path}{name}.{output_format}"
+
+
+def temp_path(path):
+    """
+    Work out the path a file is written to before it replaces the file at path, so the file at
+    path is only ever swapped whole and PowerBI never reads a half-written table.
+
+    Parameters:
+    path: str
+    The path of the finished file.
+
+    Returns:
+    str
+    The path to write to, in the same directory so os.replace is atomic.
+    """
+    return path + ".tmp"
+
+
+def write_table(df, name, output_format="csv", output_path=OUTPUT_FILE_PATH):
+    """
+    Export a table for PowerBI in the chosen format.
+
+    Parameters:
+    df: pd.DataFrame
+    The table to export.
+
+    name: str
+    The name of the table, used as the file name.
+
+    output_format: str
+    One of OUTPUT_FORMATS.
+
+    output_path: str
+    The directory the table is exported to.
+
+    Returns:
+    str
+    The path of the exported file.
+    """
+    path = table_path(name, output_format, output_path)
+
+    # Write the table alongside the old one and then swap it in
+    if output_format == "csv":
+        df.to_csv(temp_path(path), index=False)
+    elif output_format == "parquet":
+        prepare_columnar(df).to_parquet(temp_path(path), index=False, compression=COLUMNAR_COMPRESSION)
+    elif output_format == "feather":
+        # Feather can't store a non-default index
+        prepare_columnar(df).reset_index(drop=True).to_feather(temp_path(path), compression=COLUMNAR_COMPRESSION)
+    else:
+        raise ValueError(f"Unknown output format '{output_format}', expected one of {', '.join(OUTPUT_FORMATS)}")
+    os.replace(temp_path(path), path)
+
+    return path
+
+
+class CsvAppendSink:
+    """
+    Write a table to a CSV file as each file's rows are extracted, so the whole table never has
+    to be held in memory.
+
+    Each write is spooled to disk straight away. When the sink is closed the spooled rows are
+    copied into the CSV one write at a time, using the columns and dtypes that concatenating every
+    write would have produced, so the file is identical to writing the whole table at once. A
+    column that only appears in later rows (such as markingSchemeComponents once the writing has
+    been marked) is added to the end with the earlier rows left blank, and a number column that is
+    whole in one file and has blanks in another is written as a float throughout. The CSV is
+    written alongside the old one and swapped in once it is complete.
+
+    Parameters:
+    path: str
+    The path of the CSV file to write.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._spool_dir = tempfile.mkdtemp(prefix="naplan_", dir=os.path.dirname(os.path.abspath(path)))
+        self._spool_files = []
+        self._samples = []
+
+    def write(self, df):
+        """
+        Spool rows to disk.
+
+        Parameters:
+        df: pd.DataFrame
+        The rows to write.
+
+        Returns:
+        None
+        """
+        # A table with no columns adds nothing to the concatenated table
+        if df.empty and len(df.columns) == 0:
+            return
+
+        spool_file = os.path.join(self._spool_dir, f"{len(self._spool_files)}.pkl")
+        df.to_pickle(spool_file)
+        self._spool_files.append(spool_file)
+
+        # One row of each write is enough to work out the columns and dtypes of the full table
+        self._samples.append(df.head(1))
+        self.rows += len(df)
+
+    def close(self):
+        """
+        Write the spooled rows to the CSV file, or an empty table if no rows were ever written,
+        swap it in and remove the spool directory.
+
+        Returns:
+        None
+        """
+        try:
+            schema = pd.concat(self._samples, ignore_index=True) if self._samples else pd.DataFrame()
+            dtypes = schema.dtypes.to_dict()
+
+            with open(temp_path(self.path), "w", newline="") as csv_file:
+                schema.head(0).to_csv(csv_file, index=False)
+                for spool_file in self._spool_files:
+                    rows = pd.read_pickle(spool_file).reindex(columns=schema.columns).astype(dtypes)
+                    rows.to_csv(csv_file, index=False, header=False)
+            os.replace(temp_path(self.path), self.path)
+        finally:
+            shutil.rmtree(self._spool_dir, ignore_errors=True)
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import shutil
+import pandas as pd
+import extract_data
+import aggregates
+import table_specs
+import file_extraction
+import database_load
+from raw_sources import hash_file
+
+CACHE_DIR = ".naplan_cache"
+MANIFEST_FILE = "manifest.json"
+
+# Bump this when the layout of the cached tables changes without the extraction modules changing
+CACHE_FORMAT_VERSION = 1
+
+
+def extraction_version():
+    """
+    Work out the version of the extraction code, any change to extract_data.py, table_specs.py, aggregates.py,
+    file_extraction.py or database_load.py gives a new version.
+
+    Returns:
+    str
+    The extraction code version.
+    """
+    digest = hashlib.sha256()
+    for module in (extract_data, table_specs, aggregates, file_extraction, database_load):
+        with open(module.__file__, "rb") as source:
+            digest.update(source.read())
+    return f"{CACHE_FORMAT_VERSION}-{digest.hexdigest()}"
+
+
+class ExtractCache:
+    """
+    Cache the tables extracted from each raw NAPLAN file so unchanged files don't have to be extracted again.
+
+    A manifest records the content hash and size of each file alongside the extraction code
+    version. The extracted tables are pickled to the cache directory, one file per input.
+
+    Parameters:
+    cache_dir: str
+    The directory the manifest and cached tables are kept in.
+    """
+    def __init__(self, cache_dir=CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.version = extraction_version()
+        self._manifest_path = os.path.join(cache_dir, MANIFEST_FILE)
+        self._hashes = {}
+
+        manifest = None
+        if os.path.exists(self._manifest_path):
+            with open(self._manifest_path, "r") as manifest_file:
+                manifest = json.load(manifest_file)
+
+        # A different extraction code version invalidates everything in the cache
+        if manifest is None or manifest.get("extraction_version") != self.version:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            manifest = {"extraction_version": self.version, "files": {}}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self.files = manifest["files"]
+
+    def _cache_path(self, file):
+        return os.path.join(self.cache_dir, hashlib.sha1(file.encode("utf-8")).hexdigest() + ".pkl")
+
+    def _file_hash(self, file_path):
+        # The members of a zip archive share the archive's hash, so it is only hashed once
+        if file_path not in self._hashes:
+            self._hashes[file_path] = hash_file(file_path)
+        return self._hashes[file_path]
+
+    def contains(self, file, file_path, tables=()):
+        """
+        Check whether the cached tables for a file are up to date.
+
+        Parameters:
+        file: str
+        The name of the raw NAPLAN file.
+
+        file_path: str
+        The path of the raw NAPLAN file.
+
+        tables: list
+        The names of tables that have to be in the cache as well as the ones always extracted, such as the database tables.
+
+        Returns:
+        bool
+        Whether the file has cached tables, including the given tables, and hasn't changed since they were cached.
+        """
+        entry = self.files.get(file)
+        if entry is None or entry["size"] != os.path.getsize(file_path):
+            return False
+        if not set(tables) <= set(entry.get("tables", [])):
+            return False
+
+        return entry["sha256"] == self._file_hash(file_path) and os.path.exists(self._cache_path(file))
+
+    def load(self, file, file_path, tables=()):
+        """
+        Load the cached tables for a file if the file hasn't changed since they were cached.
+
+        Parameters:
+        file: str
+        The name of the raw NAPLAN file.
+
+        file_path: str
+        The path of the raw NAPLAN file.
+
+        tables: list
+        The names of tables that have to be in the cache as well as the ones always extracted.
+
+        Returns:
+        dict or None
+        The cached DataFrames for the file keyed by table name, or None if the file needs extracting.
+        """
+        if not self.contains(file, file_path, tables):
+            return None
+
+        return pd.read_pickle(self._cache_path(file))
+
+    def store(self, file, file_path, tables):
+        """
+        Cache the tables extracted from a file.
+
+        Parameters:
+        file: str
+        The name of the raw NAPLAN file.
+
+        file_path: str
+        The path of the raw NAPLAN file.
+
+        tables: dict
+        The DataFrames extracted from the file, keyed by table name.
+
+        Returns:
+        None
+        """
+        pd.to_pickle(tables, self._cache_path(file))
+        self.files[file] = {
+            "sha256": self._file_hash(file_path),
+            "size": os.path.getsize(file_path),
+            "tables": sorted(tables),
+        }
+
+    def evict(self, files):
+        """
+        Remove the cached tables for any file that is no longer in the raw data.
+
+        Parameters:
+        files: list
+        The names of the raw NAPLAN files that are still present.
+
+        Returns:
+        list
+        The names of the files that were evicted.
+        """
+        removed = [file for file in self.files if file not in files]
+        for file in removed:
+            del self.files[file]
+            if os.path.exists(self._cache_path(file)):
+                os.remove(self._cache_path(file))
+        return removed
+
+    def save(self):
+        """
+        Write the manifest to disk.
+
+        Returns:
+        None
+        """
+        manifest = {"extraction_version": self.version, "files": self.files}
+        temp_path = self._manifest_path + ".tmp"
+        with open(temp_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=4)
+        os.replace(temp_path, self._manifest_path)
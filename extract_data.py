@@ -1,27 +1,79 @@
 import pandas as pd
 import json
+from functools import cached_property
+from table_specs import compile_spec
 
 proficiency_score_adjustment_amount = 20
 
-def fix_proficiency_score_cut_off_points(proficiency_score_cut_off_points_normalized):
+# The order of the proficiency levels, from lowest to highest
+proficiency_level_order = ["Needs additional support", "Developing", "Strong", "Exceeding"]
+
+
+class ParsedDocument:
+    """
+    A raw NAPLAN file with each of its top-level sections kept as a list of records.
+
+    The attempts are split into writing and non-writing attempts in a single pass over the
+    attempts array. The table specs flatten straight from the records, each section is only
+    normalized into a DataFrame the first time it is asked for, and then only once.
+
+    Parameters:
+    raw_data: dict
+    The raw JSON data from the NAPLAN file.
+    """
+    def __init__(self, raw_data):
+        self.domain_records = raw_data.get("domains", [])
+        self.proficiency_records = raw_data.get("proficiencyScoreCutOffPoints", [])
+        self.question_records = raw_data.get("questions", [])
+
+        # Split the attempts on domain.isWritingTask
+        self.attempt_records = []
+        self.writing_attempt_records = []
+        for attempt in raw_data.get("attempts", []):
+            if (attempt.get("domain") or {}).get("isWritingTask") == True:
+                self.writing_attempt_records.append(attempt)
+            else:
+                self.attempt_records.append(attempt)
+
+    @cached_property
+    def domains(self):
+        return pd.json_normalize(self.domain_records)
+
+    @cached_property
+    def proficiency_score_cut_off_points(self):
+        return pd.json_normalize(self.proficiency_records)
+
+    @cached_property
+    def questions(self):
+        return pd.json_normalize(self.question_records)
+
+
+def fix_proficiency_score_cut_off_points(proficiency_score_cut_off_points_normalized, adjustment_amount=proficiency_score_adjustment_amount):
     """
     Fix the proficiency score cut off points by adding a startPoint column if it doesn't exist.
     The startPoint is calculated as the scoreCutPoint of the previous level for each unique disciplineId and year.
+    The "Just below developing" and "Just below exceeding" levels are then added, covering the
+    adjustment_amount points below the start of "Developing" and "Exceeding".
     
     Parameters:
     proficiency_score_cut_off_points_normalized: pd.DataFrame
     A DataFrame containing the proficiency score cut off points information
     
+    adjustment_amount: int
+    The number of points below a level that count as "just below" it
+    
     Returns:
     pd.DataFrame
     The modified DataFrame with the startPoint column added
     """    
     if "startPoint" not in proficiency_score_cut_off_points_normalized.columns:
-        # Define the order of proficiency levels
-        level_order = ["Needs additional support", "Developing", "Strong", "Exceeding"]
-        
-        # Sort the DataFrame by disciplineId, year, and proficiency level
-        proficiency_score_cut_off_points_normalized["level_order"] = proficiency_score_cut_off_points_normalized["level"].apply(lambda x: level_order.index(x))
+        # Sort the DataFrame by disciplineId, year, and proficiency level, the categorical codes give the level order
+        level_order = pd.Categorical(proficiency_score_cut_off_points_normalized["level"], categories=proficiency_level_order, ordered=True)
+        if (level_order.codes == -1).any():
+            unknown_levels = proficiency_score_cut_off_points_normalized["level"][level_order.codes == -1].unique().tolist()
+            raise ValueError(f"Unknown proficiency levels: {unknown_levels}")
+
+        proficiency_score_cut_off_points_normalized = proficiency_score_cut_off_points_normalized.assign(level_order=level_order.codes)
         proficiency_score_cut_off_points_normalized = proficiency_score_cut_off_points_normalized.sort_values(by=["disciplineId", "year", "level_order"])
         
         # Calculate the startPoint
@@ -37,123 +89,101 @@ def fix_proficiency_score_cut_off_points(proficiency_score_cut_off_points_normal
     if "disciplineId" in proficiency_score_cut_off_points_normalized.columns:
         proficiency_score_cut_off_points_normalized = proficiency_score_cut_off_points_normalized.rename(columns={"disciplineId": "domainId"})
     
-    # Add the new proficiency level "Just below developing"
-    new_rows = []
-    for _, row in proficiency_score_cut_off_points_normalized.iterrows():
-        if row["level"] == "Developing":
-            new_row = row.copy()
-            new_row["level"] = "Just below developing"
-            new_row["startPoint"] = row["startPoint"] - proficiency_score_adjustment_amount
-            new_row["scoreCutPoint"] = row["startPoint"]
-            new_rows.append(new_row)
-        elif row["level"] == "Exceeding":
-            new_row = row.copy()
-            new_row["level"] = "Just below exceeding"
-            new_row["startPoint"] = row["startPoint"] - proficiency_score_adjustment_amount
-            new_row["scoreCutPoint"] = row["startPoint"]
-            new_rows.append(new_row)
+    # Add the new proficiency levels "Just below developing" and "Just below exceeding", each one
+    # ends where the level above it starts
+    just_below_levels = {"Developing": "Just below developing", "Exceeding": "Just below exceeding"}
+    new_rows = proficiency_score_cut_off_points_normalized[proficiency_score_cut_off_points_normalized["level"].isin(just_below_levels.keys())].copy()
+    new_rows["level"] = new_rows["level"].map(just_below_levels)
+    new_rows["scoreCutPoint"] = new_rows["startPoint"]
+    new_rows["startPoint"] = new_rows["startPoint"] - adjustment_amount
     
-    proficiency_score_cut_off_points_normalized = pd.concat([proficiency_score_cut_off_points_normalized, pd.DataFrame(new_rows)], ignore_index=True)
+    if new_rows.empty:
+        proficiency_score_cut_off_points_normalized = proficiency_score_cut_off_points_normalized.reset_index(drop=True)
+    else:
+        proficiency_score_cut_off_points_normalized = pd.concat([proficiency_score_cut_off_points_normalized, new_rows], ignore_index=True)
     
     # Adjust the "Needs additional support" scoreCutPoint to reflect the 20-point change
-    proficiency_score_cut_off_points_normalized.loc[proficiency_score_cut_off_points_normalized["level"] == "Needs additional support", "scoreCutPoint"] -= proficiency_score_adjustment_amount
+    proficiency_score_cut_off_points_normalized.loc[proficiency_score_cut_off_points_normalized["level"] == "Needs additional support", "scoreCutPoint"] -= adjustment_amount
 
     # Adjust the "Strong" scoreCutPoint to reflect the 20-point change for "Just below exceeding"
-    proficiency_score_cut_off_points_normalized.loc[proficiency_score_cut_off_points_normalized["level"] == "Strong", "scoreCutPoint"] -= proficiency_score_adjustment_amount
+    proficiency_score_cut_off_points_normalized.loc[proficiency_score_cut_off_points_normalized["level"] == "Strong", "scoreCutPoint"] -= adjustment_amount
     
     return proficiency_score_cut_off_points_normalized
 
 
-def extract_domains(raw_data, df):
+def extract_domains(document):
     """
-    Extract the domains from the raw JSON and insert them into the dataframe.
+    Extract the domains from the parsed document.
     
     Parameters:
-    raw_data: dict
-    The raw JSON data from the NAPLAN file.
-    
-    df: pd.DataFrame
-    The dataframe to insert the domains into.
+    document: ParsedDocument
+    The parsed NAPLAN file.
     
     Returns:
-    None
+    pd.DataFrame
+    The domains extracted from the file.
     """
-    # Normalize the JSON data
-    raw_data = pd.json_normalize(raw_data)
-
-    # Extract the domains column
-    domains = raw_data["domains"]
-    
-    # Further normalize each JSON entry within the domains column
-    domains_normalized = pd.json_normalize(domains.explode())
+    # The domains have already been normalized by the parsed document
+    domains_normalized = document.domains
     
-    # Insert the normalized domains data into the dataframe
-    df = pd.concat([df, domains_normalized], ignore_index=True)
-
-    df.drop_duplicates(inplace=True)
-    
-    return df
+    # Duplicates across files are dropped once the domains from every file have been collected
+    return domains_normalized
 
 
-def extract_proficiency(raw_data, df):
+def extract_proficiency(document):
     """
-    Extract the proficiency data from the raw JSON and insert it into the dataframe.
+    Extract the proficiency data from the parsed document.
     
     Parameters:
-    raw_data: dict
-    The raw JSON data from the NAPLAN file.
-    
-    df: pd.DataFrame
-    The dataframe to insert the proficiency data into.
+    document: ParsedDocument
+    The parsed NAPLAN file.
     
     Returns:
-    None
+    pd.DataFrame
+    The proficiency data extracted from the file.
     """
     
-    # Normalize the JSON data
-    raw_data = pd.json_normalize(raw_data)
-
-    # Extract the proficiencyScoreCutOffPoints column
-    proficiency_sortorder = raw_data["proficiencyScoreCutOffPoints"]
-    
-    # Further normalize each JSON entry within the proficiencySortorder column
-    proficiency_sortorder_normalized = pd.json_normalize(proficiency_sortorder.explode())
+    # The proficiencyScoreCutOffPoints have already been normalized by the parsed document
+    proficiency_sortorder_normalized = document.proficiency_score_cut_off_points
     
     # Fix the proficiency score cut off points
     proficiency_sortorder_normalized = fix_proficiency_score_cut_off_points(proficiency_sortorder_normalized)
     
-    # Insert the normalized proficiencySortorder data into the dataframe
-    df = pd.concat([df, proficiency_sortorder_normalized], ignore_index=True)
-    
-    return df
-
-
-def extract_questions(raw_data, df, year):
-    """
-    Extract the questions from the raw JSON and insert them into the dataframe.
-    
-    Parameters:
-    raw_data: dict
-    The raw JSON data from the NAPLAN file.
-    
-    df: pd.DataFrame
-    The dataframe to insert the questions into.
-    
-    Returns:
-    None
-    """
-    
-    # Normalize the JSON data
-    raw_data = pd.json_normalize(raw_data)
-
-    # Extract the questions column
-    questions = raw_data["questions"]
-    
-    # Further normalize each JSON entry within the questions column
-    questions_normalized = pd.json_normalize(questions.explode())
-
-    # Keep only the specified columns
-    columns_to_keep = [
+    return proficiency_sortorder_normalized
+
+
+# The student dimension and the score of each student in each domain, built from the attempt
+# records in the same pass as the answer rows, a student sits several domains so only their
+# first attempt is kept for the dimension
+STUDENT_TABLES = {
+    "naplan_students": {
+        "columns": [
+            "student.studentId",
+            "student.metadata.studentLOTE",
+            "student.metadata.schoolStudentId"
+        ],
+        "filters": ["student.studentId"],
+        "unique": "student.studentId",
+    },
+    "student_scores": {
+        "columns": [
+            "student.studentId",
+            "student.metadata.studentLOTE",
+            "student.metadata.schoolStudentId",
+            "domain.domainId",
+            "possibleRawScore",
+            "studentRawScore",
+            "scaledScore"
+        ],
+        "filters": ["student.studentId"],
+    },
+}
+
+# The spec of each table extracted from the records of a NAPLAN file, see table_specs.compile_spec
+QUESTIONS_SPEC = {
+    "name": "questions",
+    "source": "question_records",
+    "columns": [
         "questionIdentifier",
         "descriptor",
         "domain",
@@ -164,192 +194,187 @@ def extract_questions(raw_data, df, year):
         "correct",
         "incorrect",
         "notAttempted"
-    ]
-    questions_normalized = questions_normalized.filter(items=columns_to_keep)
-
-    # Add the year column
-    questions_normalized["year"] = year
-
-    # Insert the normalized questions data into the dataframe
-    df = pd.concat([df, questions_normalized], ignore_index=True)
-    
-    return df
-
+    ],
+}
 
-def extract_attempts(raw_data, df):
-    """
-    Extract the attempts from the raw JSON and insert them into the dataframe.
-    
-    Parameters:
-    raw_data: dict
-    The raw JSON data from the NAPLAN file.
-    
-    df: pd.DataFrame
-    The dataframe to insert the attempts into.
-    
-    Returns:
-    None
-    """
-    
-    # Normalise the JSON data
-    raw_data = pd.json_normalize(raw_data)
-
-    # Extract the attempts column
-    attempts = raw_data["attempts"]
-        
-    # Further normalise each JSON entry within the attempts column
-    attempts_normalised = pd.json_normalize(attempts.explode())
-
-    attempts_normalised = attempts_normalised[attempts_normalised["domain.isWritingTask"] != True]
-
-    # Keep only the specified columns
-    columns_to_keep = [
-        "answers",
-        "attempted", 
-        "notAttempted", 
-        "correctAttempts", 
-        "incorrectAttempts", 
-        "testAttemptStatus",
+ATTEMPTS_SPEC = {
+    "name": "attempts",
+    "source": "attempt_records",
+    "columns": [
+        "attempted",
+        "notAttempted",
+        "correctAttempts",
+        "incorrectAttempts",
         "scaledScore",
         "student.testLevel",
         "student.metadata.studentLOTE",
         "student.metadata.schoolStudentId",
         "domain.domainName",
         "domain.domainId"
-    ]
-
-    # Filter columns that exist in the DataFrame
-    existing_columns = [col for col in columns_to_keep if col in attempts_normalised.columns]
-    attempts_normalised = attempts_normalised[existing_columns]
-
+    ],
     # Filter out where student.metadata.schoolStudentId is Blank, this removes students with no EDID
-    attempts_normalised = attempts_normalised[attempts_normalised["student.metadata.schoolStudentId"].notna()]
+    "filters": ["student.metadata.schoolStudentId"],
+    "explode": [
+        {
+            "path": "answers",
+            "drop": [
+                "questionNo",
+                "questionID",
+                "parallelTestSection",
+                "node",
+                "locationInTestSection",
+                "eventIdentifier",
+                "performance",
+                "writingResponse",
+                "markingSchemeComponents"
+            ],
+        },
+    ],
+    # Drop rows where the "correct" column is blank
+    "row_filters": ["correct"],
+    "tables": STUDENT_TABLES,
+}
+
+WRITING_ATTEMPTS_SPEC = {
+    "name": "writing_attempts",
+    "source": "writing_attempt_records",
+    "columns": [
+        "scaledScore",
+        "student.testLevel",
+        "student.metadata.studentLOTE",
+        "student.metadata.schoolStudentId",
+        "domain.domainName",
+        "domain.domainId"
+    ],
+    # Filter out where student.metadata.schoolStudentId is Blank, this removes students with no EDID
+    "filters": ["student.metadata.schoolStudentId"],
+    "explode": [
+        {
+            "path": "answers",
+            "drop": [
+                "incorrect",
+                "correct",
+                "questionNo",
+                "questionID",
+                "parallelTestSection",
+                "node",
+                "locationInTestSection",
+                "eventIdentifier",
+                "performance"
+            ],
+        },
+        {
+            "path": "markingSchemeComponents",
+            "missing_message": "markingSchemeComponents column does not exist - test not marked yet",
+        },
+    ],
+    "tables": STUDENT_TABLES,
+}
+
+_extract_questions = compile_spec(QUESTIONS_SPEC)
+_extract_attempts = compile_spec(ATTEMPTS_SPEC)
+_extract_writing_attempts = compile_spec(WRITING_ATTEMPTS_SPEC)
+
+
+def extract_questions(document, year):
+    """
+    Extract the questions from the parsed document.
+    
+    Parameters:
+    document: ParsedDocument
+    The parsed NAPLAN file.
     
-    # Explode the "answers" column to create a separate row for each answer entry and reset the index to ensure proper alignment of rows
-    df_exploded = attempts_normalised.explode("answers").reset_index(drop=True)
+    year: str
+    The year the file is for.
     
-    # Normalise the exploded answers column
-    attempts_normalised = pd.json_normalize(df_exploded["answers"].tolist())
-
-    # Drop the original "answers" column from the exploded DataFrame and join it with the normalised answers DataFrame,
-    # effectively merging the parsed answer fields as individual columns into the result
-    result_df = df_exploded.drop(columns=["answers"]).join(attempts_normalised)
-
-    # Remove unwanted columns
-    unwanted_columns = [
-        "testAttemptStatus",
-        "questionNo",
-        "questionID",
-        "parallelTestSection",
-        "node",
-        "locationInTestSection",
-        "eventIdentifier",
-        "performance",
-        "writingResponse",
-        "markingSchemeComponents"
-    ]
-    result_df = result_df.drop(columns=[col for col in unwanted_columns if col in result_df.columns], errors='ignore')
+    Returns:
+    pd.DataFrame
+    The questions extracted from the file.
+    """
+    return _extract_questions(document, year=year)["questions"]
 
-    # Drop rows where the "correct" column is blank
-    result_df = result_df[result_df["correct"].notna()]
 
-    # Insert the normalized attempts data into the dataframe
-    df = pd.concat([df, result_df], ignore_index=True)
+def extract_attempt_tables(document):
+    """
+    Extract the attempts from the parsed document along with the students and student scores of
+    the non-writing attempts, all in one pass over the attempt records.
+    
+    Parameters:
+    document: ParsedDocument
+    The parsed NAPLAN file.
     
-    return df
+    Returns:
+    dict
+    The attempts, naplan_students and student_scores DataFrames, keyed by table name.
+    """
+    return _extract_attempts(document)
 
 
-def extract_writing_attempts(raw_data, df):
+def extract_attempts(document):
     """
-    Extract the writing attempts from the raw JSON and insert them into the dataframe.
+    Extract the attempts from the parsed document, one row per answered question.
     
     Parameters:
-    raw_data: dict
-    The raw JSON data from the NAPLAN file.
-    
-    df: pd.DataFrame
-    The dataframe to insert the writing attempts into.
+    document: ParsedDocument
+    The parsed NAPLAN file.
     
     Returns:
-    None
+    pd.DataFrame
+    The attempts extracted from the file.
     """
-    
-    # Normalize the JSON data
-    raw_data = pd.json_normalize(raw_data)
+    return extract_attempt_tables(document)["attempts"]
 
-    # Extract the writingAttempts column
-    writing_attempts = raw_data["attempts"]
+
+def extract_writing_attempt_tables(document):
+    """
+    Extract the writing attempts from the parsed document along with the students and student
+    scores of the writing attempts, all in one pass over the writing attempt records.
     
-    # Further normalize each JSON entry within the writingAttempts column
-    writing_attempts_normalised = pd.json_normalize(writing_attempts.explode())
-
-    writing_attempts_normalised = writing_attempts_normalised[writing_attempts_normalised["domain.isWritingTask"] == True]
-
-    # Keep only the specified columns
-    columns_to_keep = [
-        "answers",
-        "attempted", 
-        "notAttempted", 
-        "correctAttempts", 
-        "incorrectAttempts", 
-        "testAttemptStatus",
-        "scaledScore",
-        "student.testLevel",
-        "student.metadata.studentLOTE",
-        "student.metadata.schoolStudentId",
-        "domain.domainName",
-        "domain.domainId"
-    ]
+    Parameters:
+    document: ParsedDocument
+    The parsed NAPLAN file.
+    
+    Returns:
+    dict
+    The writing_attempts, naplan_students and student_scores DataFrames, keyed by table name.
+    """
+    return _extract_writing_attempts(document)
 
-    # Filter columns that exist in the DataFrame
-    existing_columns = [col for col in columns_to_keep if col in writing_attempts_normalised.columns]
-    writing_attempts_normalised = writing_attempts_normalised[existing_columns]
 
-    # Filter out where student.metadata.schoolStudentId is Blank, this removes students with no EDID
-    writing_attempts_normalised = writing_attempts_normalised[writing_attempts_normalised["student.metadata.schoolStudentId"].notna()]
+def extract_writing_attempts(document):
+    """
+    Extract the writing attempts from the parsed document, one row per marking scheme component.
     
-    # Explode the "answers" column to create a separate row for each answer entry and reset the index to ensure proper alignment of rows
-    df_exploded = writing_attempts_normalised.explode("answers").reset_index(drop=True)
+    Parameters:
+    document: ParsedDocument
+    The parsed NAPLAN file.
     
-    # Normalise the exploded answers column
-    writing_attempts_normalised = pd.json_normalize(df_exploded["answers"].tolist())
+    Returns:
+    pd.DataFrame
+    The writing attempts extracted from the file.
+    """
+    return extract_writing_attempt_tables(document)["writing_attempts"]
 
-    # Drop the original "answers" column from the exploded DataFrame and join it with the normalised answers DataFrame,
-    # effectively merging the parsed answer fields as individual columns into the result
-    result_df = df_exploded.drop(columns=["answers"]).join(writing_attempts_normalised)
 
-    # Remove unwanted columns
-    unwanted_columns = [
-        "attempted",
-        "notAttempted",
-        "incorrect",
-        "correctAttempts",
-        "incorrectAttempts",
-        "testAttemptStatus",
-        "correct",
-        "questionNo",
-        "questionID",
-        "parallelTestSection",
-        "node",
-        "locationInTestSection",
-        "eventIdentifier",
-        "performance"
-    ]
-    result_df = result_df.drop(columns=[col for col in unwanted_columns if col in result_df.columns], errors='ignore')
-
-    # Check if markingSchemeComponents exists before trying to expand it
-    if "markingSchemeComponents" not in result_df.columns:
-        print("markingSchemeComponents column does not exist - test not marked yet")
-        df_expanded = result_df.copy()
-    else:
-        # Expand out markingSchemeComponents
-        df_expanded = result_df.explode("markingSchemeComponents").reset_index(drop=True)
-        # Normalize the exploded markingSchemeComponents column
-        marking_components = pd.json_normalize(df_expanded["markingSchemeComponents"])
-        # Drop the original column and join the new columns
-        df_expanded = df_expanded.drop(columns=["markingSchemeComponents"]).join(marking_components)
+def combine_student_tables(table_sets):
+    """
+    Combine the students and student scores extracted from several sets of attempts, such as the
+    non-writing and writing attempts of a file, keeping the first attempt of each student.
     
-    # Insert the normalized attempts data into the dataframe
-    df = pd.concat([df, df_expanded], ignore_index=True)
+    Parameters:
+    table_sets: list
+    The dicts of tables the students and student scores were extracted into.
     
-    return df
\ No newline at end of file
+    Returns:
+    dict
+    The naplan_students and student_scores DataFrames, keyed by table name.
+    """
+    combined = {}
+    for name in STUDENT_TABLES:
+        frames = [tables[name] for tables in table_sets if name in tables and not tables[name].empty]
+        combined[name] = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+    # Each set has already been deduplicated, a student can still appear in more than one of them
+    if "student.studentId" in combined["naplan_students"].columns:
+        combined["naplan_students"] = combined["naplan_students"].drop_duplicates(subset=["student.studentId"], ignore_index=True)
+    return combined
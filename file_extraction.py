@@ -0,0 +1,116 @@
+import raw_sources
+import extract_data
+import aggregates
+import database_load
+from run_report import RunReport
+
+
+def extract_file(document, year, report=None, file=None, batch_summaries=(), database=False):
+    """
+    Run every extract function over one parsed NAPLAN file.
+
+    Parameters:
+    document: extract_data.ParsedDocument
+    The parsed NAPLAN file.
+
+    year: str
+    The year the file is for.
+
+    report: RunReport
+    The run report each extract function is recorded in, None to not record them.
+
+    file: str
+    The name of the raw file, recorded against each stage.
+
+    batch_summaries: list
+    The summaries of the attempts already written out in batches in streaming mode.
+
+    database: bool
+    Whether to build the rows the file loads into the database as well, see database_load.DATABASE_TABLES.
+
+    Returns:
+    dict
+    The extracted DataFrames and partial aggregates for the file, keyed by table name.
+    """
+    report = report or RunReport()
+
+    extractors = [
+        ("domains", "extract_domains", document.domain_records, lambda: extract_data.extract_domains(document)),
+        ("proficiencySortorder", "extract_proficiency", document.proficiency_records, lambda: extract_data.extract_proficiency(document)),
+        ("questions", "extract_questions", document.question_records, lambda: extract_data.extract_questions(document, year)),
+        ("attempts", "extract_attempts", document.attempt_records, lambda: extract_data.extract_attempt_tables(document)),
+        ("writing_attempts", "extract_writing_attempts", document.writing_attempt_records, lambda: extract_data.extract_writing_attempt_tables(document)),
+    ]
+
+    # The attempts extractors also give the students and student scores, the non-writing ones go first
+    # as they would if every batch had been extracted at once
+    student_table_sets = {"attempts": [summary["attempt_tables"] for summary in batch_summaries],
+                          "writing_attempts": [summary["writing_attempt_tables"] for summary in batch_summaries]}
+
+    file_tables = {}
+    for name, stage_name, section, extract in extractors:
+        with report.stage(stage_name, file, rows_in=len(section)) as stage:
+            tables = extract()
+            if isinstance(tables, dict):
+                student_table_sets[name].append(tables)
+                tables = tables[name]
+            file_tables[name] = tables
+            stage["rows_out"] = len(file_tables[name])
+
+    file_tables.update(extract_data.combine_student_tables(student_table_sets["attempts"] + student_table_sets["writing_attempts"]))
+    file_tables["student_scores"]["year"] = year
+
+    # Count the answers for the aggregate tables while the extracted attempts are at hand
+    with report.stage("summarize", file, rows_in=len(file_tables["attempts"]) + len(file_tables["writing_attempts"])) as stage:
+        file_tables.update(aggregates.summarize_file(document, file_tables["attempts"], file_tables["writing_attempts"], year, batch_summaries))
+        stage["rows_out"] = len(file_tables["answer_counts"]) + len(file_tables["student_domain_scores"])
+
+    # Build the database rows from the same parsed file rather than decoding the file again when it is loaded
+    if database:
+        with report.stage("database_build", file) as stage:
+            database_tables = database_load.build_database_tables(document, year, file)
+            stage["rows_out"] = sum(len(df) for df in database_tables.values())
+        file_tables.update({database_load.DATABASE_TABLE_PREFIX + name: df for name, df in database_tables.items()})
+    return file_tables
+
+
+def process_file(source, year, report=None, file=None, json_decoder=None, database=False):
+    """
+    Load one raw NAPLAN file and extract every table from it.
+
+    Parameters:
+    source: RawSource
+    The raw NAPLAN file.
+
+    year: str
+    The year the file is for.
+
+    report: RunReport
+    The run report each stage is recorded in, None to not record them.
+
+    file: str
+    The name of the raw file, recorded against each stage.
+
+    json_decoder: str
+    The JSON backend to decode the file with, None to use the fastest one installed.
+
+    database: bool
+    Whether to build the rows the file loads into the database as well.
+
+    Returns:
+    dict
+    The extracted DataFrames for the file, keyed by table name.
+    """
+    report = report or RunReport()
+
+    # The stage records the backend that decoded the file, which is json where the chosen one couldn't
+    with report.stage("load_json", file) as stage:
+        raw = raw_sources.load_json_source(source, json_decoder, stage)
+
+    # Split the sections of the file once and share them across the extractors
+    with report.stage("parse", file, rows_in=len(raw.get("attempts") or [])) as stage:
+        document = extract_data.ParsedDocument(raw)
+        stage["rows_out"] = len(document.attempt_records) + len(document.writing_attempt_records)
+    del raw
+
+    return extract_file(document, year, report, file, database=database)
@@ -0,0 +1,285 @@
+import argparse
+import json
+import os
+import random
+
+# The non-writing domains in a real NAPLAN export, extra domains get generated names
+DOMAIN_NAMES = ["Numeracy", "Reading", "Spelling", "Grammar and punctuation"]
+
+PROFICIENCY_LEVELS = ["Needs additional support", "Developing", "Strong", "Exceeding"]
+
+TEST_LEVELS = [3, 5, 7, 9]
+
+WORDS = ["the", "dog", "ran", "across", "a", "field", "while", "children", "played", "under", "bright",
+         "summer", "sky", "and", "their", "parents", "watched", "from", "shade", "of", "old", "trees"]
+
+
+def generate_domains(domains, include_writing=True):
+    """
+    Generate the domains section of a NAPLAN file.
+
+    Parameters:
+    domains: int
+    The number of non-writing domains.
+
+    include_writing: bool
+    Whether to include the writing domain.
+
+    Returns:
+    list
+    The domain records.
+    """
+    names = [DOMAIN_NAMES[i] if i < len(DOMAIN_NAMES) else f"Domain {i + 1}" for i in range(domains)]
+    records = [{"domainId": f"D{i + 1:03d}", "domainName": name, "isWritingTask": False} for i, name in enumerate(names)]
+    if include_writing:
+        records.append({"domainId": "DWRIT", "domainName": "Writing", "isWritingTask": True})
+    return records
+
+
+def generate_proficiency(domains, rng):
+    """
+    Generate the proficiencyScoreCutOffPoints section of a NAPLAN file, without startPoints like the real exports.
+
+    Parameters:
+    domains: list
+    The domain records.
+
+    rng: random.Random
+    The seeded random number generator.
+
+    Returns:
+    list
+    The proficiency score cut off point records.
+    """
+    records = []
+    for domain in domains:
+        for test_level in TEST_LEVELS:
+            cut_point = 250 + test_level * 25 + rng.randint(-10, 10)
+            for level in PROFICIENCY_LEVELS:
+                cut_point += rng.randint(60, 90)
+                records.append({"disciplineId": domain["domainId"], "year": test_level, "level": level, "scoreCutPoint": cut_point})
+    return records
+
+
+def generate_questions(domains, year, answers_per_attempt, rng):
+    """
+    Generate the questions section of a NAPLAN file, one question per answer slot of each non-writing domain.
+
+    Parameters:
+    domains: list
+    The domain records.
+
+    year: int
+    The year the file is for.
+
+    answers_per_attempt: int
+    The number of questions in each non-writing test.
+
+    rng: random.Random
+    The seeded random number generator.
+
+    Returns:
+    list
+    The question records.
+    """
+    records = []
+    for domain in domains:
+        if domain["isWritingTask"]:
+            continue
+        for number in range(answers_per_attempt):
+            attempts = rng.randint(20, 120)
+            correct = rng.randint(0, attempts)
+            not_attempted = rng.randint(0, 5)
+            records.append({
+                "questionId": f"{domain['domainId']}-{year}-{number:03d}",
+                "eventIdentifier": f"EV{year}",
+                "questionIdentifier": f"{domain['domainId']}-Q{number:03d}",
+                "nodeIdentifier": f"N{number % 7}",
+                # Some descriptors are reworded from year to year, like the real exports
+                "descriptor": f"{domain['domainName']} skill {number}" + (f" ({year})" if number % 13 == 0 else ""),
+                "domain": domain["domainName"],
+                "domainId": domain["domainId"],
+                "subdomain": f"{domain['domainName']} strand {number % 4 + 1}",
+                "testLevel": rng.choice(TEST_LEVELS),
+                "difficulty": rng.randint(300, 800),
+                "proficiencyLevel": rng.choice(PROFICIENCY_LEVELS),
+                "attempts": attempts,
+                "correct": correct,
+                "incorrect": attempts - correct,
+                "notAttempted": not_attempted,
+                "correctPercentage": round(100 * correct / attempts, 2),
+            })
+    return records
+
+
+def generate_attempt(student, domain, year, answers_per_attempt, marking_scheme_components, marked, response_words, rng):
+    """
+    Generate one student's attempt at one domain.
+
+    Parameters:
+    student: dict
+    The student record.
+
+    domain: dict
+    The domain record.
+
+    year: int
+    The year the file is for.
+
+    answers_per_attempt: int
+    The number of answers in a non-writing attempt.
+
+    marking_scheme_components: int
+    The number of marking scheme components on a marked writing answer.
+
+    marked: bool
+    Whether the writing has been marked, unmarked writing has no markingSchemeComponents.
+
+    response_words: int
+    The number of words in each writing response.
+
+    rng: random.Random
+    The seeded random number generator.
+
+    Returns:
+    dict
+    The attempt record.
+    """
+    answers = []
+    if domain["isWritingTask"]:
+        answer = {
+            "questionId": f"{domain['domainId']}-{year}",
+            "questionNo": 1,
+            "node": "W1",
+            "answeredOn": f"{year}-03-12T10:{rng.randint(0, 59):02d}:00",
+            "writingResponse": " ".join(rng.choice(WORDS) for _ in range(response_words)),
+        }
+        if marked:
+            answer["markingSchemeComponents"] = [{
+                "rowguid": f"MS{component:02d}",
+                "name": f"Criterion {component + 1}",
+                "effectiveScore": rng.randint(0, 6),
+                "maxScore": 6,
+            } for component in range(marking_scheme_components)]
+        answers.append(answer)
+    else:
+        for number in range(answers_per_attempt):
+            answer = {
+                "questionId": f"{domain['domainId']}-{year}-{number:03d}",
+                "questionNo": number + 1,
+                "questionID": number,
+                "parallelTestSection": rng.choice(["A", "B", "C"]),
+                "node": f"N{number % 7}",
+                "locationInTestSection": number % 10,
+                "eventIdentifier": f"EV{year}",
+                "answeredOn": f"{year}-03-13T09:{rng.randint(0, 59):02d}:00",
+                "performance": rng.random(),
+            }
+            # Unanswered questions have no correct value
+            if rng.random() > 0.03:
+                answer["correct"] = rng.random() > 0.4
+            answers.append(answer)
+
+    correct = sum(1 for answer in answers if answer.get("correct"))
+    return {
+        "attempted": len(answers),
+        "notAttempted": 0,
+        "correctAttempts": correct,
+        "incorrectAttempts": len(answers) - correct,
+        "testAttemptStatus": "Complete",
+        "possibleRawScore": len(answers),
+        "studentRawScore": correct,
+        "scaledScore": round(rng.uniform(250, 750), 1) if rng.random() > 0.02 else None,
+        "student": student,
+        "domain": domain,
+        "answers": answers,
+    }
+
+
+def generate_naplan_file(year, students=100, domains=4, answers_per_attempt=30, marking_scheme_components=10,
+                         marked=True, response_words=250, missing_student_id_rate=0.05, seed=0):
+    """
+    Generate a realistic raw NAPLAN file.
+
+    Parameters:
+    year: int
+    The year the file is for.
+
+    students: int
+    The number of students, each attempts every domain.
+
+    domains: int
+    The number of non-writing domains, the writing domain is always included.
+
+    answers_per_attempt: int
+    The number of answers in a non-writing attempt.
+
+    marking_scheme_components: int
+    The number of marking scheme components on a marked writing answer.
+
+    marked: bool
+    Whether the writing has been marked, unmarked writing has no markingSchemeComponents.
+
+    response_words: int
+    The number of words in each writing response.
+
+    missing_student_id_rate: float
+    The share of students without a schoolStudentId.
+
+    seed: int
+    The seed for the random number generator, the same seed gives the same file.
+
+    Returns:
+    dict
+    The raw NAPLAN file.
+    """
+    rng = random.Random(f"{seed}-{year}")
+    domain_records = generate_domains(domains)
+
+    attempts = []
+    for number in range(students):
+        metadata = {"studentLOTE": rng.choice(["Y", "N"])}
+        if rng.random() >= missing_student_id_rate:
+            metadata["schoolStudentId"] = f"{100000 + number}"
+        student = {"studentId": f"STU{seed}-{number:06d}", "testLevel": rng.choice(TEST_LEVELS), "metadata": metadata}
+
+        for domain in domain_records:
+            attempts.append(generate_attempt(student, domain, year, answers_per_attempt, marking_scheme_components,
+                                             marked, response_words, rng))
+
+    return {
+        "domains": domain_records,
+        "proficiencyScoreCutOffPoints": generate_proficiency(domain_records, rng),
+        "questions": generate_questions(domain_records, year, answers_per_attempt, rng),
+        "attempts": attempts,
+    }
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Generate synthetic raw NAPLAN files for testing and benchmarking.")
+    parser.add_argument("--output", default="raw_data_synthetic", help="The directory to write the files to")
+    parser.add_argument("--years", type=int, nargs="+", default=[2023], help="The years to generate a file for")
+    parser.add_argument("--students", type=int, default=100, help="The number of students in each file")
+    parser.add_argument("--domains", type=int, default=4, help="The number of non-writing domains")
+    parser.add_argument("--answers-per-attempt", type=int, default=30, help="The number of answers in a non-writing attempt")
+    parser.add_argument("--marking-scheme-components", type=int, default=10, help="The number of marking scheme components per writing answer")
+    parser.add_argument("--unmarked-years", type=int, nargs="*", default=[], help="Years whose writing hasn't been marked, so have no markingSchemeComponents")
+    parser.add_argument("--seed", type=int, default=0, help="The seed for the random number generator")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_arguments()
+    os.makedirs(args.output, exist_ok=True)
+
+    for year in args.years:
+        raw = generate_naplan_file(year, args.students, args.domains, args.answers_per_attempt, args.marking_scheme_components,
+                                   marked=year not in args.unmarked_years, seed=args.seed)
+        file_path = os.path.join(args.output, f"{year} Synthetic School.json")
+        with open(file_path, "w") as raw_json_file:
+            json.dump(raw, raw_json_file)
+        print(f"Generated file: {file_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import importlib
+import json
+import mmap
+
+# The JSON decoders to try, fastest first, json from the standard library is always available
+JSON_BACKENDS = ["orjson", "ujson", "json"]
+
+
+def available_backends():
+    """
+    List the JSON decoders that are installed.
+
+    Returns:
+    list
+    The names of the installed backends, fastest first.
+    """
+    available = []
+    for name in JSON_BACKENDS:
+        try:
+            importlib.import_module(name)
+        except ImportError:
+            continue
+        available.append(name)
+    return available
+
+
+def select_backend(name=None):
+    """
+    Pick the JSON decoder to use.
+
+    Parameters:
+    name: str
+    The name of a backend in JSON_BACKENDS, None or "auto" to use the fastest one installed.
+
+    Returns:
+    str
+    The name of the backend.
+    """
+    available = available_backends()
+    if name is None or name == "auto":
+        return available[0]
+
+    if name not in JSON_BACKENDS:
+        raise ValueError(f"Unknown JSON backend '{name}', expected one of auto, {', '.join(JSON_BACKENDS)}")
+    if name not in available:
+        raise ImportError(f"The {name} JSON backend isn't installed, install it with 'pip install {name}'")
+    return name
+
+
+def decode(buffer, backend, record=None):
+    """
+    Decode a JSON document from a bytes-like buffer.
+
+    orjson decodes straight from the buffer, the other backends need it as bytes. A document a fast
+    backend can't decode (such as one with NaN values) is decoded again with json so every backend
+    accepts the same files.
+
+    Parameters:
+    buffer: bytes-like
+    The UTF-8 encoded JSON document.
+
+    backend: str
+    The name of the backend to decode with.
+
+    record: dict
+    The name of the backend that decoded the document is set as record["json_backend"], so a fallback to json
+    shows up, None to not record it.
+
+    Returns:
+    object
+    The decoded document.
+    """
+    record = {} if record is None else record
+    record["json_backend"] = backend
+    if backend == "orjson":
+        import orjson
+        try:
+            return orjson.loads(buffer)
+        except orjson.JSONDecodeError:
+            pass
+    elif backend == "ujson":
+        import ujson
+        try:
+            return ujson.loads(bytes(buffer))
+        except ValueError:
+            pass
+
+    record["json_backend"] = "json"
+    return json.loads(bytes(buffer))
+
+
+def load_json_file(file_path, backend=None, record=None):
+    """
+    Load a JSON file through a memory-mapped buffer, so the file is decoded from its bytes without
+    first being read into a text string.
+
+    Parameters:
+    file_path: str
+    The path of the JSON file.
+
+    backend: str
+    The name of the backend to decode with, None to use the fastest one installed.
+
+    record: dict
+    The name of the backend that decoded the file is set as record["json_backend"], None to not record it.
+
+    Returns:
+    object
+    The decoded document.
+    """
+    backend = backend or select_backend()
+    with open(file_path, "rb") as json_file:
+        try:
+            mapped = mmap.mmap(json_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # An empty file can't be memory-mapped
+            return decode(json_file.read(), backend, record)
+
+        with mapped:
+            buffer = memoryview(mapped)
+            try:
+                return decode(buffer, backend, record)
+            finally:
+                buffer.release()
@@ -1,62 +1,443 @@
-import pandas as pd
-import json
-import extract_data
-import os
-
-# Define the DataFrames
-domainsDF = pd.DataFrame()
-proficiencySortorder = pd.DataFrame()
-questions = pd.DataFrame()
-attempts = pd.DataFrame()
-writing_attempts = pd.DataFrame()
-marking_scheme_components = pd.DataFrame()
-
-# Load the raw data from the JSON file
-dataFilePath = "raw_data\\"
-dataFiles = os.listdir(dataFilePath)
-for file in dataFiles:
-    if file.endswith(".json"):
-        print(f"Processing file: {file}")
-        year = file.split(" ")[0]
-        with open(os.path.join(dataFilePath, file), "r") as raw_json_file:
-            raw = json.load(raw_json_file)
-            domainsDF = extract_data.extract_domains(raw, domainsDF)
-            proficiencySortorder = extract_data.extract_proficiency(raw, proficiencySortorder)
-            questions = extract_data.extract_questions(raw, questions, year)
-            attempts = extract_data.extract_attempts(raw, attempts)
-            writing_attempts = extract_data.extract_writing_attempts(raw, writing_attempts)
-            print(f"Finished processing file: {file}")
-
-# Check if the questionIdentifier has duplicates with different descriptor values
-duplicates_check = questions.groupby('questionIdentifier')['descriptor'].nunique().reset_index()
-questionIds_with_different_descriptors = duplicates_check[duplicates_check['descriptor'] > 1]['questionIdentifier'].tolist()
-
-if questionIds_with_different_descriptors:
-    print(f"Found {len(questionIds_with_different_descriptors)} questionIdentifiers with different descriptor values:")
-    
-    # Create a DataFrame to store all duplicates
-    all_duplicates = pd.DataFrame()
-    
-    # Collect all the duplicates in one DataFrame
-    for qid in questionIds_with_different_descriptors:
-        different_descriptors = questions[questions['questionIdentifier'] == qid][['questionIdentifier', 'descriptor', 'year']].drop_duplicates()
-        all_duplicates = pd.concat([all_duplicates, different_descriptors], ignore_index=True)
-    
-    # Export the duplicates to a CSV file
-    all_duplicates.to_csv("duplicate_descriptors.csv", index=False)
-    print(f"Exported {len(all_duplicates)} duplicate records to 'duplicate_descriptors.csv'")
-else:
-    print("No questionIdentifiers found with different descriptor values.")
-
-# Export the full questions dataset
-questions.to_csv("powerBI_import\\questions.csv", index=False)
-
-# Export Student Responses to csv's, have split writing responses into it's own file
-attempts.to_csv("powerBI_import\\attempts.csv", index=False)
-writing_attempts.to_csv("powerBI_import\\writing_attempts.csv", index=False)
-
-# Export the proficiency sort order
-proficiencySortorder.to_csv("powerBI_import\\proficiencySortorder.csv", index=False)
-
-# Export the domains
-domainsDF.to_csv("powerBI_import\\domains.csv", index=False)
\ No newline at end of file
+import argparse
+import json_backend
+import raw_sources
+import streaming
+import export_tables
+import database_load
+import audit
+import aggregates
+import star_schema
+import watch
+import partitioned_output
+import file_extraction
+from concurrent.futures import ProcessPoolExecutor
+from table_accumulator import TableAccumulator
+from extract_cache import ExtractCache
+from compact_dtypes import compact_dtypes, memory_usage, print_memory_report
+from run_report import RunReport, DEFAULT_REPORT_FILE
+
+# The tables that repeat the same strings on every answer row
+COMPACT_TABLES = ["attempts", "writing_attempts"]
+
+# The tables with a row per answer, which can be written out file by file rather than all at once
+ANSWER_TABLES = ["attempts", "writing_attempts"]
+
+DATA_FILE_PATH = "raw_data\\"
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Unpack the NAPLAN JSON files in raw_data into CSV files for PowerBI.")
+    parser.add_argument("--streaming", action="store_true",
+                        help="Stream the attempts of each file in batches so memory is bounded by the batch size rather than the file size")
+    parser.add_argument("--batch-size", type=int, default=streaming.DEFAULT_BATCH_SIZE,
+                        help="The number of attempts to flatten at a time in streaming mode")
+    parser.add_argument("--append-csv", action="store_true",
+                        help="Spool each file's attempts to disk as soon as the file is extracted and write the CSV files from them at the end, so only one file's attempts are held in memory")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="The number of files to process at once, each in its own process")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Extract every file again instead of loading unchanged files from the extract cache")
+    parser.add_argument("--output-format", choices=export_tables.OUTPUT_FORMATS, default="csv",
+                        help="The format the tables in powerBI_import are written in, parquet and feather are compressed and typed")
+    parser.add_argument("--compact-dtypes", action="store_true",
+                        help="Store the attempts tables in compact dtypes (categoricals, booleans, downcast numbers) to use less memory")
+    parser.add_argument("--audits", nargs="+", choices=list(audit.AUDIT_CHECKS), default=audit.DEFAULT_AUDIT_CHECKS,
+                        help="The consistency checks to run over the questions, each exports the questionIdentifiers that fail it to a CSV file")
+    parser.add_argument("--star-schema", action="store_true",
+                        help="Write the attempts as fact tables of integer keys and measures with dimension tables for students, domains, questions, marking schemes and writing responses")
+    parser.add_argument("--partitioned", action="store_true",
+                        help="Write the attempts, writing attempts and questions as year=/domainId= partitions, only rewriting the partitions whose rows changed")
+    parser.add_argument("--json-backend", choices=["auto"] + json_backend.JSON_BACKENDS, default="auto",
+                        help="The JSON decoder used to load the raw files, auto uses the fastest one installed (orjson, then ujson, then json)")
+    parser.add_argument("--database",
+                        help="Also load the raw files into this SQLite database file, building its rows as each file is extracted")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only replace the database rows of files that are new or changed since the last load instead of rebuilding it")
+    parser.add_argument("--report", default=DEFAULT_REPORT_FILE,
+                        help="The JSON file the time, rows and memory of each stage of the run are written to")
+    parser.add_argument("--trace-memory", action="store_true",
+                        help="Trace allocations to record the peak memory of each stage in the run report, this slows the run down")
+    parser.add_argument("--profile-stage",
+                        help="Run every instance of this stage (e.g. extract_attempts) under cProfile, writing the stats to the profiles directory")
+    parser.add_argument("--watch", action="store_true",
+                        help="Keep running, updating the tables whenever files in raw_data are added, changed or removed")
+    parser.add_argument("--poll-seconds", type=float, default=watch.DEFAULT_POLL_SECONDS,
+                        help="How often raw_data is checked for changes in watch mode")
+    parser.add_argument("--settle-seconds", type=float, default=watch.DEFAULT_SETTLE_SECONDS,
+                        help="How long the files in raw_data have to stay the same before they are read in watch mode, so files still being copied aren't read")
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.streaming and args.workers > 1:
+        parser.error("--streaming can't be combined with --workers, streaming writes every batch from the main process")
+    if args.streaming and args.output_format != "csv":
+        parser.error("--streaming only writes csv files")
+    if args.append_csv and args.output_format != "csv":
+        parser.error("--append-csv only writes csv files")
+    if args.append_csv and args.star_schema:
+        parser.error("--append-csv can't be combined with --star-schema, the keys are assigned over every file's attempts at once")
+    if args.streaming and args.star_schema:
+        parser.error("--star-schema can't be combined with --streaming, the keys are assigned over every file's attempts at once")
+    if args.partitioned and (args.streaming or args.append_csv or args.star_schema):
+        parser.error("--partitioned can't be combined with --streaming, --append-csv or --star-schema")
+    if args.incremental and not args.database:
+        parser.error("--incremental needs --database")
+    if args.streaming and args.database:
+        parser.error("--database can't be combined with --streaming, the database rows are built from each file's attempts at once")
+    if args.watch and (args.no_cache or args.streaming):
+        parser.error("--watch can't be combined with --no-cache or --streaming, it relies on the extract cache to only extract new or changed files")
+
+    try:
+        export_tables.check_output_format(args.output_format)
+        args.json_backend = json_backend.select_backend(args.json_backend)
+    except ImportError as error:
+        parser.error(str(error))
+
+    return args
+
+
+def process_file_worker(source, year, file, trace_memory=False, profile_stage=None, json_decoder=None, database=False):
+    """
+    Process one raw NAPLAN file in a worker process, recording its stages in a run report of its own.
+
+    This is what each worker process runs when files are processed in parallel.
+
+    Parameters:
+    source: RawSource
+    The raw NAPLAN file.
+
+    year: str
+    The year the file is for.
+
+    file: str
+    The name of the raw file.
+
+    trace_memory: bool
+    Whether to trace allocations to measure the peak memory of each stage.
+
+    profile_stage: str
+    The name of a stage to run under cProfile, None to not profile.
+
+    json_decoder: str
+    The JSON backend to decode the file with, None to use the fastest one installed.
+
+    database: bool
+    Whether to build the rows the file loads into the database as well.
+
+    Returns:
+    tuple
+    The extracted DataFrames for the file keyed by table name, and the recorded stages.
+    """
+    report = RunReport(trace_memory, profile_stage)
+    with report.stage("file", file) as stage:
+        file_tables = file_extraction.process_file(source, year, report, file, json_decoder, database)
+        stage["rows_out"] = sum(len(df) for df in file_tables.values())
+    return file_tables, report.stages
+
+
+def compact_file_tables(file_tables, memory_before, memory_after):
+    """
+    Compact the dtypes of the attempts tables extracted from one file, keeping track of the memory saved.
+
+    Parameters:
+    file_tables: dict
+    The DataFrames extracted from one file, keyed by table name.
+
+    memory_before: dict
+    The bytes used by each table before compacting, keyed by table name and added to.
+
+    memory_after: dict
+    The bytes used by each table after compacting, keyed by table name and added to.
+
+    Returns:
+    dict
+    The DataFrames for the file with the attempts tables compacted.
+    """
+    for name in COMPACT_TABLES:
+        memory_before[name] = memory_before.get(name, 0) + memory_usage(file_tables[name])
+        file_tables[name] = compact_dtypes(file_tables[name])
+        memory_after[name] = memory_after.get(name, 0) + memory_usage(file_tables[name])
+    return file_tables
+
+
+def merge_file_tables(tables, file_tables):
+    """
+    Add the tables extracted from one file to the tables for the whole run.
+
+    Parameters:
+    tables: dict
+    The TableAccumulators for the whole run, keyed by table name.
+
+    file_tables: dict
+    The DataFrames extracted from one file, keyed by table name.
+
+    Returns:
+    None
+    """
+    for name, df in file_tables.items():
+        tables[name].add(df)
+
+
+def run(args):
+    """
+    Extract the raw NAPLAN files and write every table.
+
+    Parameters:
+    args: argparse.Namespace
+    The parsed command line arguments.
+
+    Returns:
+    None
+    """
+    report = RunReport(args.trace_memory, args.profile_stage)
+    report.info["arguments"] = vars(args)
+    report.info["json_backend"] = "ijson" if args.streaming else args.json_backend
+
+    # Collect the DataFrames from each file, the same domains appear in every file so they are deduplicated
+    tables = {
+        "domains": TableAccumulator("domains", deduplicate=True),
+        "proficiencySortorder": TableAccumulator("proficiencySortorder"),
+        "questions": TableAccumulator("questions"),
+        "attempts": TableAccumulator("attempts"),
+        "writing_attempts": TableAccumulator("writing_attempts"),
+        "answer_counts": TableAccumulator("answer_counts"),
+        "student_domain_scores": TableAccumulator("student_domain_scores"),
+        "question_lookup": TableAccumulator("question_lookup"),
+        "naplan_students": TableAccumulator("naplan_students", deduplicate=True, key=["student.studentId"]),
+        "student_scores": TableAccumulator("student_scores"),
+    }
+
+    # In streaming mode the attempts are spooled to disk batch by batch and in append mode file by file,
+    # instead of every file's attempts being held in memory until the end
+    sinks = {}
+    if args.streaming:
+        sinks = {name: streaming.BatchCsvWriter(export_tables.table_path(name, "csv")) for name in ANSWER_TABLES}
+    elif args.append_csv:
+        sinks = {name: export_tables.CsvAppendSink(export_tables.table_path(name, "csv")) for name in ANSWER_TABLES}
+
+    # In partitioned mode the rows of each file are split into their year and domainId partitions as they come in
+    partitions = {}
+    if args.partitioned:
+        partitions = {name: partitioned_output.PartitionedTableWriter(name, args.output_format)
+                      for name in partitioned_output.PARTITIONED_TABLES}
+
+    # Load the raw data from the JSON files, compressed files and zip archives are read without unpacking them
+    sources = raw_sources.discover_sources(DATA_FILE_PATH)
+    dataFiles = [source.name for source in sources]
+    years = [source.year for source in sources]
+    report.info["files"] = {source.name: raw_sources.source_size(source) for source in sources}
+
+    # Unchanged files are loaded from the extract cache so only new or modified files are extracted,
+    # streaming mode never holds a whole file's attempts in memory so it doesn't use the cache
+    cache = None
+    if not args.no_cache and not args.streaming:
+        cache = ExtractCache()
+        for file in cache.evict(dataFiles):
+            print(f"Removed cached tables for deleted file: {file}")
+
+    # The database rows of each file that needs loading are built while the file is extracted, and loaded
+    # as soon as it is done, the rows of files removed from raw_data are deleted straight away
+    loader = None
+    if args.database:
+        with report.stage("database_start"):
+            loader = database_load.DatabaseLoader(args.database, dataFiles, sources, args.incremental)
+
+    # Work out which files need extracting up front, so the worker processes can start on them straight away,
+    # a cached file is extracted again if it needs loading into the database and its database rows weren't cached
+    databaseTables = {file: database_load.DATABASE_TABLE_KEYS if loader is not None and file in loader.pending else []
+                      for file in dataFiles}
+    toProcess = [(file, source, year) for file, source, year in zip(dataFiles, sources, years)
+                 if cache is None or not cache.contains(file, source.path, databaseTables[file])]
+    processFiles = {file for file, _, _ in toProcess}
+
+    # Outside streaming mode a compressed file is decompressed into memory in full before it is decoded
+    if not args.streaming and any(source.compression is not None for _, source, _ in toProcess):
+        print("Compressed files are decompressed into memory before they are decoded, use --streaming for exports too large for that")
+
+    # Process the files in parallel, the results are taken in file order below so the
+    # merged tables have the same row order as a serial run
+    executor = None
+    results = None
+    if args.workers > 1 and toProcess:
+        executor = ProcessPoolExecutor(max_workers=args.workers)
+        results = executor.map(process_file_worker,
+                               [source for _, source, _ in toProcess],
+                               [year for _, _, year in toProcess],
+                               [file for file, _, _ in toProcess],
+                               [args.trace_memory] * len(toProcess),
+                               [args.profile_stage] * len(toProcess),
+                               [args.json_backend] * len(toProcess),
+                               [bool(databaseTables[file]) for file, _, _ in toProcess])
+
+    memoryBefore = {}
+    memoryAfter = {}
+    try:
+        for file, source, year in zip(dataFiles, sources, years):
+            if file not in processFiles:
+                with report.stage("cache_load", file) as stage:
+                    file_tables = cache.load(file, source.path, databaseTables[file])
+                    stage["rows_out"] = sum(len(df) for df in file_tables.values())
+                print(f"Loaded file from cache: {file}")
+            else:
+                if results is not None:
+                    file_tables, file_stages = next(results)
+                    report.add_stages(file_stages)
+                else:
+                    print(f"Processing file: {file}")
+                    with report.stage("file", file) as stage:
+                        if args.streaming:
+                            batch_summaries = []
+                            with report.stage("stream", file):
+                                with raw_sources.open_source(source) as raw_json_file:
+                                    document = streaming.stream_document(raw_json_file, sinks["attempts"], sinks["writing_attempts"],
+                                                                         args.batch_size, batch_summaries)
+                            file_tables = file_extraction.extract_file(document, year, report, file, batch_summaries)
+                        else:
+                            file_tables = file_extraction.process_file(source, year, report, file, args.json_backend,
+                                                                       bool(databaseTables[file]))
+                        stage["rows_out"] = sum(len(df) for df in file_tables.values())
+                if cache is not None:
+                    with report.stage("cache_store", file):
+                        cache.store(file, source.path, file_tables)
+                        cache.save()
+                print(f"Finished processing file: {file}")
+
+            # A cached file can have database rows even when it doesn't need loading, they are dropped
+            database_tables = database_load.pop_database_tables(file_tables)
+            if loader is not None and file in loader.pending:
+                with report.stage("database_insert", file, rows_in=sum(len(df) for df in database_tables.values())):
+                    loader.load(file, year, database_tables)
+            del database_tables
+
+            if args.compact_dtypes:
+                with report.stage("compact_dtypes", file):
+                    file_tables = compact_file_tables(file_tables, memoryBefore, memoryAfter)
+
+            # Write the attempts out as soon as each file is done rather than holding every file's attempts until the end
+            for name, sink in sinks.items():
+                with report.stage(f"write_{name}", file, rows_in=len(file_tables[name])):
+                    sink.write(file_tables.pop(name))
+
+            for name, writer in partitions.items():
+                df = file_tables[name]
+                writer.add(df, year, partitioned_output.partition_domain_ids(name, df, file_tables["domains"]))
+
+            # The partitions hold the attempts, the questions are still needed for the audit
+            for name in ANSWER_TABLES:
+                if name in partitions:
+                    file_tables.pop(name)
+
+            merge_file_tables(tables, file_tables)
+    except Exception:
+        if loader is not None:
+            loader.close()
+        raise
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    if cache is not None:
+        cache.save()
+
+    if args.compact_dtypes:
+        print_memory_report(memoryBefore, memoryAfter)
+
+    # Concatenate each table once now every file has been processed
+    for name, table in tables.items():
+        with report.stage(f"build_{name}") as stage:
+            table_report = table.report()
+            stage["rows_out"] = table_report["rows"]
+        print(f"Table {table_report['table']}: {table_report['rows']} rows, {table_report['bytes'] / 1024 / 1024:.1f} MB")
+
+    domainsDF = tables["domains"].build()
+    proficiencySortorder = tables["proficiencySortorder"].build()
+    questions = tables["questions"].build()
+    attempts = tables["attempts"].build()
+    writing_attempts = tables["writing_attempts"].build()
+
+    # Check the questionIdentifiers have consistent values across the years, such as the descriptor
+    with report.stage("audit", rows_in=len(questions)) as stage:
+        audit_results = audit.run_audits(questions, args.audits)
+        stage["rows_out"] = sum(len(drift) for drift in audit_results.values())
+
+    # Export the full questions dataset
+    if not partitions:
+        with report.stage("write_questions", rows_in=len(questions)):
+            export_tables.write_table(questions, "questions", args.output_format)
+
+    # Export Student Responses to csv's, have split writing responses into it's own file
+    if partitions:
+        for name, writer in partitions.items():
+            with report.stage(f"write_{name}") as stage:
+                counts = writer.write()
+                stage["rows_out"] = counts["written"]
+            print(f"Partitions of {name}: {counts['written']} written, {counts['unchanged']} unchanged, {counts['removed']} removed")
+    elif sinks:
+        for name, sink in sinks.items():
+            with report.stage(f"write_{name}"):
+                sink.close()
+    elif args.star_schema:
+        # Replace the strings repeated on every answer row with integer keys into dimension tables
+        with report.stage("build_star_schema", rows_in=len(attempts) + len(writing_attempts)) as stage:
+            star_tables = star_schema.build_star_schema(attempts, writing_attempts, domainsDF, tables["question_lookup"].build())
+            stage["rows_out"] = sum(len(df) for df in star_tables.values())
+        for name, df in star_tables.items():
+            with report.stage(f"write_{name}", rows_in=len(df)):
+                export_tables.write_table(df, name, args.output_format)
+    else:
+        with report.stage("write_attempts", rows_in=len(attempts)):
+            export_tables.write_table(attempts, "attempts", args.output_format)
+        with report.stage("write_writing_attempts", rows_in=len(writing_attempts)):
+            export_tables.write_table(writing_attempts, "writing_attempts", args.output_format)
+
+    # Export the proficiency sort order
+    with report.stage("write_proficiencySortorder", rows_in=len(proficiencySortorder)):
+        export_tables.write_table(proficiencySortorder, "proficiencySortorder", args.output_format)
+
+    # Export the domains
+    with report.stage("write_domains", rows_in=len(domainsDF)):
+        export_tables.write_table(domainsDF, "domains", args.output_format)
+
+    # Export the students and each student's score in each domain
+    for name in ["naplan_students", "student_scores"]:
+        df = tables[name].build()
+        with report.stage(f"write_{name}", rows_in=len(df)):
+            export_tables.write_table(df, name, args.output_format)
+
+    # Export the aggregate tables so PowerBI doesn't have to roll up the attempts itself
+    with report.stage("build_aggregates") as stage:
+        aggregate_tables = aggregates.build_aggregates(tables["answer_counts"].build(), tables["student_domain_scores"].build(),
+                                                       tables["question_lookup"].build())
+        stage["rows_out"] = sum(len(df) for df in aggregate_tables.values())
+    for name, df in aggregate_tables.items():
+        with report.stage(f"write_{name}", rows_in=len(df)):
+            export_tables.write_table(df, name, args.output_format)
+
+    # Build the SQLite database's indexes now every file has been loaded
+    if loader is not None:
+        with report.stage("database_finish"):
+            loader.finish()
+
+    # The files the chosen JSON backend couldn't decode, which were decoded with json instead
+    report.info["json_fallbacks"] = [record["file"] for record in report.stages
+                                     if record["stage"] == "load_json" and record.get("json_backend") not in (None, args.json_backend)]
+
+    report.write(args.report)
+
+
+def main():
+    args = parse_arguments()
+    if not args.watch:
+        run(args)
+        return
+
+    # Unchanged files come from the extract cache, so each run only extracts the new or changed files
+    try:
+        watch.watch_directory(DATA_FILE_PATH, lambda: run(args), args.poll_seconds, args.settle_seconds)
+    except KeyboardInterrupt:
+        print("Stopped watching")
+
+
+if __name__ == "__main__":
+    main()
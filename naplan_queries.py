@@ -0,0 +1,262 @@
+import pathlib
+import sqlite3
+from collections import OrderedDict
+import pandas as pd
+
+# The number of query results kept in the cache
+DEFAULT_CACHE_SIZE = 128
+
+# A proficiency level runs from its startPoint up to its scoreCutPoint, the top level has no upper bound
+TOP_PROFICIENCY_LEVEL = "Exceeding"
+
+
+def student_levels_cte(condition):
+    """
+    Build the SQL of the student_levels common table expression, the test level each student sat in each domain and year.
+
+    The database doesn't store a student's test level with their scores, so it is taken from the
+    questions they answered, and for writing from their writing responses. Every file has its own
+    rows for the questions it holds, so an attempt is joined to the question from its own file. The condition is applied
+    to each half before grouping, so only the rows that are needed are read.
+
+    Parameters:
+    condition: str
+    An SQL condition on the rows to use, with {attempt} in place of the attempts or writing_responses
+    alias (for studentId and year) and {domain} in place of the questions or domains alias (for domainId).
+
+    Returns:
+    str
+    The SQL of the CTE, to go after WITH.
+    """
+    return f"""
+        student_levels AS (
+            SELECT a.studentId, q.domainId, a.year, MIN(q.testLevel) AS testLevel
+            FROM attempts a
+            JOIN questions q ON q.sourceFile = a.sourceFile AND q.questionId = a.questionId
+            WHERE {condition.format(attempt="a", domain="q")}
+            GROUP BY a.studentId, q.domainId, a.year
+            UNION ALL
+            SELECT w.studentId, d.domainId, w.year, MIN(w.testLevel) AS testLevel
+            FROM writing_responses w
+            JOIN domains d ON d.isWritingTask = 1
+            WHERE {condition.format(attempt="w", domain="d")}
+            GROUP BY w.studentId, d.domainId, w.year
+        )
+    """
+
+
+# Join each student score (s) with its test level (l) and the proficiency level (p) it falls in,
+# the cut points are stored against the test level in the year column and come from the same file as the score
+SCORE_LEVELS_SQL = f"""
+    FROM student_scores s
+    LEFT JOIN domains d ON d.domainId = s.domainId
+    LEFT JOIN student_levels l ON l.studentId = s.studentId AND l.domainId = s.domainId AND l.year = s.year
+    LEFT JOIN proficiency_score_cut_off_points p
+        ON p.sourceFile = s.sourceFile AND p.domainId = s.domainId AND p.year = l.testLevel
+        AND s.scaledScore >= p.startPoint
+        AND (s.scaledScore < p.scoreCutPoint OR p.level = '{TOP_PROFICIENCY_LEVEL}')
+"""
+
+PROFICIENCY_DISTRIBUTION_SQL = f"""
+    WITH {student_levels_cte("(:year IS NULL OR {attempt}.year = :year) AND (:domain_id IS NULL OR {domain}.domainId = :domain_id)")}
+    SELECT s.year, l.testLevel, s.domainId, d.domainName, p.level AS proficiencyLevel,
+        COUNT(*) AS students,
+        ROUND(100.0 * COUNT(*) / SUM(COUNT(*)) OVER (PARTITION BY s.year, l.testLevel, s.domainId), 2) AS percentage
+    {SCORE_LEVELS_SQL}
+    WHERE (:year IS NULL OR s.year = :year)
+        AND (:test_level IS NULL OR l.testLevel = :test_level)
+        AND (:domain_id IS NULL OR s.domainId = :domain_id)
+    GROUP BY s.year, l.testLevel, s.domainId, p.level
+    ORDER BY s.year, l.testLevel, d.domainName, p.startPoint IS NULL, MIN(p.startPoint)
+"""
+
+# The answers are counted in one scan of the attempts before they are joined to the questions,
+# rather than looking up each question's attempts through the questionId index. Each file has its
+# own question rows, so the answers of each file are joined to that file's questions, then the files
+# of the same year are added together.
+QUESTION_DIFFICULTY_SQL = """
+    SELECT a.year, q.domainId, d.domainName, q.testLevel, a.questionId, q.questionIdentifier, q.descriptor,
+        q.difficulty, SUM(a.answered) AS answered, SUM(a.correct) AS correct,
+        ROUND(100.0 * SUM(a.correct) / SUM(a.answered), 2) AS correctPercentage
+    FROM (
+        SELECT year, sourceFile, questionId, COUNT(correct) AS answered, SUM(correct) AS correct
+        FROM attempts
+        WHERE :year IS NULL OR year = :year
+        GROUP BY year, sourceFile, questionId
+    ) a
+    JOIN questions q ON q.sourceFile = a.sourceFile AND q.questionId = a.questionId
+    LEFT JOIN domains d ON d.domainId = q.domainId
+    WHERE (:test_level IS NULL OR q.testLevel = :test_level)
+        AND (:domain_id IS NULL OR q.domainId = :domain_id)
+    GROUP BY a.year, q.domainId, q.testLevel, a.questionId, q.questionIdentifier, q.descriptor, q.difficulty
+    ORDER BY a.year, d.domainName, q.testLevel, correctPercentage
+"""
+
+# A student can be looked up by their NAPLAN studentId or by their schoolStudentId
+STUDENT_HISTORY_SQL = f"""
+    WITH matched_students AS (
+        SELECT :student_id AS studentId
+        UNION
+        SELECT studentId FROM naplan_students WHERE schoolStudentId = :student_id
+    ),
+    {student_levels_cte("{attempt}.studentId IN (SELECT studentId FROM matched_students)")}
+    SELECT s.studentId, s.year, s.domainId, d.domainName, l.testLevel, s.possibleRawScore, s.studentRawScore,
+        s.scaledScore, p.level AS proficiencyLevel
+    {SCORE_LEVELS_SQL}
+    WHERE s.studentId IN (SELECT studentId FROM matched_students)
+    ORDER BY s.year, d.domainName
+"""
+
+
+class NaplanQueries:
+    """
+    Run the analytics questions that are asked over and over against the NAPLAN SQLite database,
+    keeping the results in a bounded LRU cache keyed by query and parameters.
+
+    The database is opened read only. Before each query the connection's data_version is checked,
+    it only changes when another connection commits, such as a load. When it has changed the
+    loaded_files table is read again and the cache is cleared if the files it lists, their hashes
+    or when they were loaded have changed, so a repeat query is answered from the cache until a
+    load changes the data.
+
+    Parameters:
+    database_path: str
+    The path of the SQLite database file.
+
+    cache_size: int
+    The number of query results to keep, the least recently used result is dropped first.
+    """
+    def __init__(self, database_path, cache_size=DEFAULT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self.conn = sqlite3.connect(pathlib.Path(database_path).resolve().as_uri() + "?mode=ro", uri=True)
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._data_version = None
+        self._loaded_files = None
+
+    def _check_for_changes(self):
+        data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if data_version == self._data_version:
+            return
+        self._data_version = data_version
+
+        # A full rebuild loads every file again even when its hash hasn't changed, and the database
+        # is in the middle of being rebuilt if loaded_files doesn't exist
+        try:
+            loaded_files = self.conn.execute("SELECT sourceFile, sha256, loadedOn FROM loaded_files ORDER BY sourceFile").fetchall()
+        except sqlite3.OperationalError:
+            loaded_files = None
+
+        if loaded_files != self._loaded_files:
+            self._loaded_files = loaded_files
+            self._cache.clear()
+            self.generation += 1
+
+    def _query(self, name, sql, params):
+        self._check_for_changes()
+
+        key = (name, tuple(sorted(params.items())))
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return self._cache[key].copy()
+
+        self.misses += 1
+        result = pd.read_sql_query(sql, self.conn, params=params)
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return result.copy()
+
+    def proficiency_distribution(self, year=None, test_level=None, domain_id=None):
+        """
+        Count the students at each proficiency level in each cohort, a year and test level, and domain.
+
+        Parameters:
+        year: int
+        Only the cohorts of this year, None for every year.
+
+        test_level: int
+        Only the cohorts at this test level (3, 5, 7 or 9), None for every test level.
+
+        domain_id: str
+        Only this domain, None for every domain.
+
+        Returns:
+        pd.DataFrame
+        The number and percentage of students at each proficiency level of each cohort and domain,
+        scores that have no scaled score or cut points have a blank level.
+        """
+        return self._query("proficiency_distribution", PROFICIENCY_DISTRIBUTION_SQL,
+                           {"year": year, "test_level": test_level, "domain_id": domain_id})
+
+    def question_difficulty(self, year=None, test_level=None, domain_id=None):
+        """
+        Work out how many students answered each question correctly in each year, hardest first.
+
+        Parameters:
+        year: int
+        Only the questions of this year, None for every year.
+
+        test_level: int
+        Only the questions of this test level, None for every test level.
+
+        domain_id: str
+        Only the questions of this domain, None for every domain.
+
+        Returns:
+        pd.DataFrame
+        The details of each question with the number of answers, correct answers and correct percentage in each year.
+        """
+        return self._query("question_difficulty", QUESTION_DIFFICULTY_SQL,
+                           {"year": year, "test_level": test_level, "domain_id": domain_id})
+
+    def student_history(self, student_id):
+        """
+        List a student's scores and proficiency levels in every domain across the years.
+
+        Parameters:
+        student_id: str
+        The student's NAPLAN studentId or their schoolStudentId.
+
+        Returns:
+        pd.DataFrame
+        The test level, raw score, scaled score and proficiency level of each domain the student sat in each year.
+        """
+        return self._query("student_history", STUDENT_HISTORY_SQL, {"student_id": student_id})
+
+    def cache_info(self):
+        """
+        Report how well the cache is working.
+
+        Returns:
+        dict
+        The cache hits and misses, the number of cached results, the maximum and the generation of the data.
+        """
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._cache),
+            "max_size": self.cache_size,
+            "generation": self.generation,
+        }
+
+    def clear_cache(self):
+        """
+        Drop every cached result.
+
+        Returns:
+        None
+        """
+        self._cache.clear()
+
+    def close(self):
+        """
+        Close the connection to the database.
+
+        Returns:
+        None
+        """
+        self.conn.close()
@@ -0,0 +1,205 @@
+import hashlib
+import json
+import os
+from urllib.parse import quote
+import pandas as pd
+import export_tables
+from table_accumulator import TableAccumulator
+
+# The tables written as year/domainId partitions in partitioned mode
+PARTITIONED_TABLES = ["attempts", "writing_attempts", "questions"]
+
+# The name Hive gives the partition of rows with a blank partition value
+DEFAULT_PARTITION = "__HIVE_DEFAULT_PARTITION__"
+
+# Each partitioned table keeps a record of what is in each of its partitions, the leading
+# underscore is the Hive convention for files that aren't part of the table
+MANIFEST_FILE = "_partitions.json"
+
+
+def partition_value(value):
+    """
+    Format a value for use in a partition directory name.
+
+    Parameters:
+    value: object
+    The partition value.
+
+    Returns:
+    str
+    The value with any characters that can't go in a directory name percent-encoded.
+    """
+    if pd.isna(value):
+        return DEFAULT_PARTITION
+    return quote(str(value), safe="")
+
+
+def partition_domain_ids(name, df, domains):
+    """
+    Work out the domainId each row of a table is partitioned on.
+
+    The attempts tables hold the domainId of each row, the questions only hold the domain name
+    so it is looked up in the domains from the same file.
+
+    Parameters:
+    name: str
+    The name of the table.
+
+    df: pd.DataFrame
+    The rows extracted from one file.
+
+    domains: pd.DataFrame
+    The domains extracted from the same file.
+
+    Returns:
+    pd.Series
+    The domainId of each row, blank where it isn't known.
+    """
+    if name == "questions":
+        if "domain" not in df.columns or not {"domainName", "domainId"}.issubset(domains.columns):
+            return pd.Series(pd.NA, index=df.index, dtype=object)
+        domain_ids = domains.drop_duplicates(subset=["domainName"]).set_index("domainName")["domainId"]
+        return df["domain"].map(domain_ids)
+
+    if "domain.domainId" not in df.columns:
+        return pd.Series(pd.NA, index=df.index, dtype=object)
+    return df["domain.domainId"]
+
+
+def frame_digest(df):
+    """
+    Hash the columns, dtypes and rows of a table, so a partition is only rewritten when what would be written changes.
+
+    Parameters:
+    df: pd.DataFrame
+    The table to hash.
+
+    Returns:
+    str
+    The SHA-256 hex digest of the table.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([[str(column), str(dtype)] for column, dtype in df.dtypes.items()]).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+class PartitionedTableWriter:
+    """
+    Write a table as Hive-style partitions, one file per year and domainId such as
+    attempts\\year=2023\\domainId=D-NUM\\part.csv, so PowerBI incremental refresh only has to
+    pull the partitions that changed.
+
+    The rows of each file are split into their partitions as the file is extracted. When the
+    partitions are written each one is hashed and compared with the manifest from the last run,
+    only the partitions whose rows changed are rewritten and partitions that no longer have any
+    rows are removed.
+
+    Parameters:
+    name: str
+    The name of the table, used as the directory name.
+
+    output_format: str
+    One of export_tables.OUTPUT_FORMATS.
+
+    output_path: str
+    The directory the table's directory is created in.
+    """
+    def __init__(self, name, output_format="csv", output_path=export_tables.OUTPUT_FILE_PATH):
+        self.name = name
+        self.output_format = output_format
+        self.table_dir = f"{output_path}{name}"
+        self._partitions = {}
+
+    def add(self, df, year, domain_ids):
+        """
+        Add the rows extracted from one file to their partitions.
+
+        Parameters:
+        df: pd.DataFrame
+        The rows extracted from one file.
+
+        year: str
+        The year the file is for.
+
+        domain_ids: pd.Series
+        The domainId of each row.
+
+        Returns:
+        None
+        """
+        if df.empty:
+            return
+
+        for domain_id, rows in df.groupby(domain_ids, dropna=False, sort=False):
+            key = f"year={partition_value(year)}/domainId={partition_value(domain_id)}"
+            self._partitions.setdefault(key, TableAccumulator(f"{self.name} {key}")).add(rows)
+
+    def _partition_path(self, key, output_format):
+        return os.path.join(self.table_dir, *key.split("/"), f"part.{output_format}")
+
+    def _load_manifest(self):
+        manifest_path = os.path.join(self.table_dir, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return {"output_format": self.output_format, "partitions": {}}
+        with open(manifest_path, "r") as manifest_file:
+            return json.load(manifest_file)
+
+    def _remove_partition(self, key, output_format):
+        path = self._partition_path(key, output_format)
+        if os.path.exists(path):
+            os.remove(path)
+
+        # Remove the partition's directories once they are empty
+        directory = os.path.dirname(path)
+        while directory != self.table_dir:
+            try:
+                os.rmdir(directory)
+            except OSError:
+                break
+            directory = os.path.dirname(directory)
+
+    def write(self):
+        """
+        Write the partitions whose rows have changed since the last run and remove the ones that have gone.
+
+        Returns:
+        dict
+        The number of partitions written, left unchanged and removed.
+        """
+        previous = self._load_manifest()
+        previous_partitions = previous["partitions"]
+
+        # Partitions in another format are all written again
+        if previous["output_format"] != self.output_format:
+            for key in previous_partitions:
+                self._remove_partition(key, previous["output_format"])
+            previous_partitions = {}
+
+        partitions = {}
+        counts = {"written": 0, "unchanged": 0, "removed": 0}
+        for key in sorted(self._partitions):
+            df = self._partitions.pop(key).build()
+            partitions[key] = frame_digest(df)
+
+            path = self._partition_path(key, self.output_format)
+            if previous_partitions.get(key) == partitions[key] and os.path.exists(path):
+                counts["unchanged"] += 1
+                continue
+
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            export_tables.write_table(df, "part", self.output_format, output_path=os.path.join(os.path.dirname(path), ""))
+            counts["written"] += 1
+
+        for key in previous_partitions:
+            if key not in partitions:
+                self._remove_partition(key, self.output_format)
+                counts["removed"] += 1
+
+        os.makedirs(self.table_dir, exist_ok=True)
+        manifest_path = os.path.join(self.table_dir, MANIFEST_FILE)
+        with open(export_tables.temp_path(manifest_path), "w") as manifest_file:
+            json.dump({"output_format": self.output_format, "partitions": partitions}, manifest_file, indent=4)
+        os.replace(export_tables.temp_path(manifest_path), manifest_path)
+
+        return counts
@@ -0,0 +1,187 @@
+import gzip
+import hashlib
+import os
+import zipfile
+import json_backend
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# The compressed file extensions that hold a single raw file, and the compression each one uses
+COMPRESSED_EXTENSIONS = {".gz": "gzip", ".zst": "zstd"}
+
+
+class RawSource:
+    """
+    A raw NAPLAN file, either a JSON file, a compressed JSON file or a JSON member of a zip archive.
+
+    Parameters:
+    path: str
+    The path of the file on disk, the archive for a zip member.
+
+    member: str
+    The name of the JSON member inside the zip archive, None for a file that isn't in a zip.
+    """
+    def __init__(self, path, member=None):
+        self.path = path
+        self.member = member
+
+        file = os.path.basename(path)
+        extension = os.path.splitext(file)[1]
+        if member is not None:
+            self.compression = "zip"
+            self.name = f"{file}/{member}"
+            member_name = os.path.basename(member)
+        elif extension in COMPRESSED_EXTENSIONS:
+            self.compression = COMPRESSED_EXTENSIONS[extension]
+            self.name = file
+            member_name = file[:-len(extension)]
+        else:
+            self.compression = None
+            self.name = file
+            member_name = file
+
+        # The year is the start of the raw file's own name, even when it is inside an archive
+        self.year = member_name.split(" ")[0]
+
+    def __repr__(self):
+        return f"RawSource({self.name!r})"
+
+
+def is_raw_file(file):
+    """
+    Check whether a file in the raw data directory holds raw NAPLAN data.
+
+    Parameters:
+    file: str
+    The name of the file.
+
+    Returns:
+    bool
+    Whether the file is a .json, .json.gz, .json.zst or .zip file.
+    """
+    return file.endswith((".json", ".zip") + tuple(".json" + extension for extension in COMPRESSED_EXTENSIONS))
+
+
+def discover_sources(directory):
+    """
+    Find the raw NAPLAN files in a directory: .json files, .json.gz and .json.zst files, and the
+    .json members of .zip archives.
+
+    Parameters:
+    directory: str
+    The directory holding the raw files.
+
+    Returns:
+    list
+    A RawSource for each raw file, in directory order with the members of an archive in archive order.
+    """
+    sources = []
+    for file in os.listdir(directory):
+        path = os.path.join(directory, file)
+        if not is_raw_file(file):
+            continue
+        if file.endswith(".zip"):
+            with zipfile.ZipFile(path) as archive:
+                members = [info.filename for info in archive.infolist() if not info.is_dir() and info.filename.endswith(".json")]
+            sources.extend(RawSource(path, member) for member in members)
+        else:
+            sources.append(RawSource(path))
+    return sources
+
+
+def hash_file(file_path):
+    """
+    Hash the contents of a file.
+
+    Parameters:
+    file_path: str
+    The path of the file to hash.
+
+    Returns:
+    str
+    The SHA-256 hex digest of the file contents.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_size(source):
+    """
+    Work out how many bytes a raw file takes up on disk.
+
+    Parameters:
+    source: RawSource
+    The raw file.
+
+    Returns:
+    int
+    The size of the file, or of the compressed member for a zip member.
+    """
+    if source.member is not None:
+        with zipfile.ZipFile(source.path) as archive:
+            return archive.getinfo(source.member).compress_size
+    return os.path.getsize(source.path)
+
+
+def open_source(source):
+    """
+    Open a raw file for reading, decompressing it as it is read so it never has to be unpacked to disk.
+
+    Parameters:
+    source: RawSource
+    The raw file.
+
+    Returns:
+    file object
+    The decompressed contents of the raw file, opened in binary mode.
+    """
+    if source.compression == "gzip":
+        return gzip.open(source.path, "rb")
+
+    if source.compression == "zstd":
+        if zstandard is None:
+            raise ImportError(f"Reading {source.name} requires the zstandard package, install it with 'pip install zstandard'")
+        return zstandard.ZstdDecompressor().stream_reader(open(source.path, "rb"), read_across_frames=True, closefd=True)
+
+    if source.compression == "zip":
+        # The member keeps the archive file open until the member itself is closed
+        with zipfile.ZipFile(source.path) as archive:
+            return archive.open(source.member)
+
+    return open(source.path, "rb")
+
+
+def load_json_source(source, backend=None, record=None):
+    """
+    Load a raw file, a plain JSON file is memory-mapped and a compressed one is decompressed in memory.
+
+    The JSON backends decode from a whole buffer, so the decompressed file is held in memory next to
+    the decoded document while it is decoded. Exports too large for that are read with --streaming,
+    which parses the decompressed stream incrementally through open_source.
+
+    Parameters:
+    source: RawSource
+    The raw file.
+
+    backend: str
+    The name of the JSON backend to decode with, None to use the fastest one installed.
+
+    record: dict
+    The name of the backend that decoded the file is set as record["json_backend"], None to not record it.
+
+    Returns:
+    object
+    The decoded document.
+    """
+    if source.compression is None:
+        return json_backend.load_json_file(source.path, backend, record)
+
+    backend = backend or json_backend.select_backend()
+    with open_source(source) as raw_json_file:
+        return json_backend.decode(raw_json_file.read(), backend, record)
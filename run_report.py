@@ -0,0 +1,181 @@
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    # resource is only available on Unix, the process peak memory isn't recorded elsewhere
+    resource = None
+
+DEFAULT_REPORT_FILE = "run_report.json"
+PROFILE_DIR = "profiles"
+
+
+def max_rss_mb():
+    """
+    Get the peak resident memory of the process so far.
+
+    Returns:
+    float or None
+    The peak resident memory in MB, None where it can't be measured.
+    """
+    if resource is None:
+        return None
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class RunReport:
+    """
+    Record the wall time, CPU time, rows in and out and peak memory of each stage of a run,
+    and write them out as a JSON run report.
+
+    The peak memory of a stage is the most memory Python allocated on top of what was already
+    in use when the stage started. Tracing allocations slows a run down, so it is only measured
+    when trace_memory is set, the peak resident memory of the process is always recorded.
+
+    Parameters:
+    trace_memory: bool
+    Whether to trace allocations to measure the peak memory of each stage.
+
+    profile_stage: str
+    The name of a stage to run under cProfile, None to not profile.
+    """
+    def __init__(self, trace_memory=False, profile_stage=None):
+        self.trace_memory = trace_memory
+        self.profile_stage = profile_stage
+        self.stages = []
+        self.info = {}
+        self._active = []
+        self._started = datetime.now()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def _update_peaks(self):
+        # Give every open stage the peak since the last update, then start measuring the next peak
+        _, peak = tracemalloc.get_traced_memory()
+        for record in self._active:
+            record["_peak"] = max(record["_peak"], peak)
+        tracemalloc.reset_peak()
+
+    @contextmanager
+    def stage(self, name, file=None, rows_in=None):
+        """
+        Measure a stage of the run, set "rows_out" on the yielded record to record the rows it produced.
+
+        Parameters:
+        name: str
+        The name of the stage.
+
+        file: str
+        The raw file the stage is working on, None for stages over the whole run.
+
+        rows_in: int
+        The number of rows going into the stage.
+
+        Returns:
+        generator
+        Yields the record for the stage.
+        """
+        record = {"stage": name, "file": file, "rows_in": rows_in, "rows_out": None}
+
+        if self.trace_memory:
+            self._update_peaks()
+            record["_start_memory"], record["_peak"] = tracemalloc.get_traced_memory()
+            self._active.append(record)
+
+        profiler = None
+        if name == self.profile_stage:
+            profiler = cProfile.Profile()
+
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record["wall_seconds"] = round(time.perf_counter() - wall_start, 4)
+            record["cpu_seconds"] = round(time.process_time() - cpu_start, 4)
+
+            record["peak_memory_mb"] = None
+            if self.trace_memory:
+                self._update_peaks()
+                self._active.remove(record)
+                record["peak_memory_mb"] = round((record.pop("_peak") - record.pop("_start_memory")) / 1024 / 1024, 2)
+            record["max_rss_mb"] = max_rss_mb()
+
+            if profiler is not None:
+                os.makedirs(PROFILE_DIR, exist_ok=True)
+
+                # A zip member is named archive.zip/member, the separators can't go in the profile's file name
+                profile_name = name
+                if file is not None:
+                    profile_name = f"{name} - {os.path.splitext(file)[0].replace('/', '_').replace(os.sep, '_')}"
+                record["profile"] = os.path.join(PROFILE_DIR, f"{profile_name}.prof")
+                profiler.dump_stats(record["profile"])
+
+            self.stages.append(record)
+
+    def add_stages(self, stages):
+        """
+        Add the stages recorded by another RunReport, such as one in a worker process.
+
+        Parameters:
+        stages: list
+        The stage records.
+
+        Returns:
+        None
+        """
+        self.stages.extend(stages)
+
+    def summary(self):
+        """
+        Total the time spent in each stage across every file.
+
+        Returns:
+        dict
+        The number of times each stage ran with its total wall and CPU time, keyed by stage name.
+        """
+        summary = {}
+        for record in self.stages:
+            totals = summary.setdefault(record["stage"], {"count": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0})
+            totals["count"] += 1
+            totals["wall_seconds"] = round(totals["wall_seconds"] + record["wall_seconds"], 4)
+            totals["cpu_seconds"] = round(totals["cpu_seconds"] + record["cpu_seconds"], 4)
+        return summary
+
+    def write(self, report_path=DEFAULT_REPORT_FILE):
+        """
+        Write the run report to a JSON file.
+
+        Parameters:
+        report_path: str
+        The path of the report file.
+
+        Returns:
+        None
+        """
+        report = {
+            "started": self._started.isoformat(timespec="seconds"),
+            "finished": datetime.now().isoformat(timespec="seconds"),
+            "wall_seconds": round(time.perf_counter() - self._wall_start, 4),
+            "cpu_seconds": round(time.process_time() - self._cpu_start, 4),
+            "max_rss_mb": max_rss_mb(),
+            "info": self.info,
+            "summary": self.summary(),
+            "stages": self.stages,
+        }
+        with open(report_path, "w") as report_file:
+            json.dump(report, report_file, indent=4, default=str)
+        print(f"Wrote run report to '{report_path}'")
@@ -0,0 +1,221 @@
+import numpy as np
+import pandas as pd
+
+# The dimension and fact tables written in place of the attempts tables
+STAR_SCHEMA_TABLES = [
+    "dim_students",
+    "dim_domains",
+    "dim_questions",
+    "dim_marking_schemes",
+    "dim_writing_responses",
+    "fact_attempts",
+    "fact_writing_scores",
+]
+
+STUDENT_ID = "student.metadata.schoolStudentId"
+
+
+class KeyIndex:
+    """
+    Assign dense integer surrogate keys to the distinct values of one or more columns.
+
+    A dictionary from value to key is kept as the hash index, so the same value is given the
+    same key in every table it is looked up from and keys are handed out in first-seen order
+    starting at 1. Each distinct value is only hashed into the index once per lookup, every row
+    is then mapped to its key with the codes from pd.factorize.
+
+    Parameters:
+    columns: list
+    The columns that together identify a dimension row.
+
+    key_name: str
+    The name of the surrogate key column.
+    """
+    def __init__(self, columns, key_name):
+        self.columns = columns
+        self.key_name = key_name
+        self._keys = {}
+
+    def _values(self, df):
+        # A single column is factorized as is, several columns are factorized as tuples
+        if len(self.columns) == 1:
+            return df[self.columns[0]]
+        values = df[self.columns].astype(object)
+        values = values.where(values.notna(), None)
+        return pd.Series(list(values.itertuples(index=False, name=None)), index=df.index)
+
+    def assign(self, df):
+        """
+        Look up the key of each row, adding values that haven't been seen before to the index.
+
+        Parameters:
+        df: pd.DataFrame
+        The rows holding the key columns.
+
+        Returns:
+        pd.Series
+        The key of each row, blank where the key columns are blank.
+        """
+        codes, uniques = pd.factorize(self._values(df))
+        if len(uniques) == 0:
+            return pd.Series(pd.array([pd.NA] * len(df), dtype="Int32"), index=df.index)
+
+        keys = np.fromiter((self._keys.setdefault(value, len(self._keys) + 1) for value in uniques),
+                           dtype=np.int64, count=len(uniques))
+
+        result = pd.array(keys[codes], dtype="Int32")
+        result[codes == -1] = pd.NA
+        return pd.Series(result, index=df.index)
+
+    def table(self):
+        """
+        Build the dimension table of every value in the index.
+
+        Returns:
+        pd.DataFrame
+        The surrogate key and the key columns of each distinct value, in key order.
+        """
+        values = list(self._keys)
+        if len(self.columns) == 1:
+            table = pd.DataFrame({self.columns[0]: values})
+        else:
+            table = pd.DataFrame(values, columns=self.columns)
+        table.insert(0, self.key_name, pd.array(list(self._keys.values()), dtype="Int32"))
+        return table
+
+
+def first_attributes(frames, key_columns, attribute_columns):
+    """
+    Take the first value of each attribute for each key across several tables.
+
+    Parameters:
+    frames: list
+    The tables holding the key and attribute columns.
+
+    key_columns: list
+    The columns identifying a dimension row.
+
+    attribute_columns: list
+    The attribute columns of the dimension.
+
+    Returns:
+    pd.DataFrame
+    One row per key with its attributes.
+    """
+    columns = key_columns + attribute_columns
+    attributes = pd.concat([df.reindex(columns=columns) for df in frames], ignore_index=True)
+    return attributes.dropna(subset=key_columns).drop_duplicates(subset=key_columns)
+
+
+def dimension(index, attributes):
+    """
+    Build a dimension table from a key index and the attributes of each key.
+
+    Parameters:
+    index: KeyIndex
+    The key index of the dimension.
+
+    attributes: pd.DataFrame
+    The attributes of each key, from first_attributes.
+
+    Returns:
+    pd.DataFrame
+    The dimension table.
+    """
+    table = index.table()
+    attributes = attributes.drop_duplicates(subset=index.columns)
+    return table.merge(attributes, on=index.columns, how="left")
+
+
+def fact(df, keys, moved_columns):
+    """
+    Build a fact table from a detail table, replacing the columns held in the dimensions with their keys.
+
+    Parameters:
+    df: pd.DataFrame
+    The detail table.
+
+    keys: dict
+    The key Series for each dimension, keyed by key column name.
+
+    moved_columns: list
+    The columns that are held in the dimensions instead.
+
+    Returns:
+    pd.DataFrame
+    The fact table, the keys followed by the remaining columns.
+    """
+    measures = df.drop(columns=[column for column in moved_columns if column in df.columns])
+    return pd.concat([pd.DataFrame(keys, index=df.index), measures], axis=1).reset_index(drop=True)
+
+
+def build_star_schema(attempts, writing_attempts, domains, question_lookup):
+    """
+    Split the attempts tables into dimension tables with dense integer keys and fact tables
+    holding only the keys and measures, so the long strings are stored once per value.
+
+    Parameters:
+    attempts: pd.DataFrame
+    The attempts from every file.
+
+    writing_attempts: pd.DataFrame
+    The writing attempts from every file.
+
+    domains: pd.DataFrame
+    The domains from every file.
+
+    question_lookup: pd.DataFrame
+    The questionIdentifier and subdomain of each questionId in each year.
+
+    Returns:
+    dict
+    The dimension and fact tables, keyed by table name.
+    """
+    students = KeyIndex([STUDENT_ID], "studentKey")
+    domain_keys = KeyIndex(["domain.domainId"], "domainKey")
+    questions = KeyIndex(["questionId"], "questionKey")
+    marking_schemes = KeyIndex(["rowguid"], "markingSchemeKey")
+    responses = KeyIndex([STUDENT_ID, "questionId"], "responseKey")
+
+    # Number the domains in the order of the domains table so their keys don't depend on the attempts
+    domains = domains.rename(columns={"domainId": "domain.domainId", "domainName": "domain.domainName", "isWritingTask": "domain.isWritingTask"})
+    domain_keys.assign(domains.reindex(columns=["domain.domainId"]).dropna())
+
+    attempts = attempts.reindex(columns=attempts.columns.union([STUDENT_ID, "domain.domainId", "questionId"], sort=False))
+    attempt_keys = {
+        "studentKey": students.assign(attempts),
+        "domainKey": domain_keys.assign(attempts),
+        "questionKey": questions.assign(attempts),
+    }
+
+    writing_attempts = writing_attempts.reindex(columns=writing_attempts.columns.union([STUDENT_ID, "domain.domainId", "questionId", "rowguid"], sort=False))
+    writing_keys = {
+        "studentKey": students.assign(writing_attempts),
+        "domainKey": domain_keys.assign(writing_attempts),
+        "questionKey": questions.assign(writing_attempts),
+        "responseKey": responses.assign(writing_attempts),
+        "markingSchemeKey": marking_schemes.assign(writing_attempts),
+    }
+
+    # The question details come from the questions section, the domain of a question from its answers
+    question_attributes = first_attributes([attempts, writing_attempts], ["questionId"], ["domain.domainId"])
+    question_attributes = question_attributes.merge(
+        question_lookup.reindex(columns=["questionId", "year", "questionIdentifier", "subdomain"]).drop_duplicates(subset=["questionId"]),
+        on="questionId", how="left")
+    question_attributes["domainKey"] = domain_keys.assign(question_attributes)
+    question_attributes = question_attributes.drop(columns=["domain.domainId"])
+
+    # The LOTE status of a student is recorded on each attempt and can change between years, so it stays in the facts
+    student_columns = []
+    domain_columns = ["domain.domainName", "domain.isWritingTask"]
+
+    return {
+        "dim_students": dimension(students, first_attributes([attempts, writing_attempts], [STUDENT_ID], student_columns)),
+        "dim_domains": dimension(domain_keys, first_attributes([domains, attempts, writing_attempts], ["domain.domainId"], domain_columns)),
+        "dim_questions": dimension(questions, question_attributes),
+        "dim_marking_schemes": dimension(marking_schemes, first_attributes([writing_attempts], ["rowguid"], ["name"])),
+        "dim_writing_responses": dimension(responses, first_attributes([writing_attempts], [STUDENT_ID, "questionId"], ["writingResponse"])),
+        "fact_attempts": fact(attempts, attempt_keys, [STUDENT_ID, "questionId", "domain.domainId"] + student_columns + domain_columns),
+        "fact_writing_scores": fact(writing_attempts, writing_keys,
+                                    [STUDENT_ID, "questionId", "domain.domainId", "rowguid", "name", "writingResponse"] + student_columns + domain_columns),
+    }
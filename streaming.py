@@ -0,0 +1,162 @@
+import extract_data
+import aggregates
+import export_tables
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def iter_sections(raw_json_file):
+    """
+    Incrementally parse a raw NAPLAN file, yielding each top-level section as it is read.
+
+    The attempts section is never built in full, each attempt record is yielded on its own
+    as soon as it has been parsed.
+
+    Parameters:
+    raw_json_file: file object
+    The raw NAPLAN file, opened in binary mode.
+
+    Returns:
+    generator
+    Yields (key, value) tuples, one per top-level section and one per attempt record for the attempts section.
+    """
+    if ijson is None:
+        raise ImportError("Streaming mode requires the ijson package, install it with 'pip install ijson'")
+
+    section = None
+    builder = None
+    for prefix, event, value in ijson.parse(raw_json_file, use_float=True):
+        if builder is None:
+            # Keep track of which top-level section is being read
+            if prefix == "":
+                if event == "map_key":
+                    section = value
+                continue
+
+            # Skip over the attempts array itself so each attempt is built on its own
+            if prefix == "attempts" and event in ("start_array", "end_array"):
+                continue
+
+            builder = ObjectBuilder()
+
+        builder.event(event, value)
+
+        # Once every container has been closed the value is complete
+        if not builder.containers:
+            yield section, builder.value
+            builder = None
+
+
+def stream_document(raw_json_file, attempts_writer, writing_attempts_writer, batch_size=DEFAULT_BATCH_SIZE, batch_summaries=None):
+    """
+    Stream a raw NAPLAN file, extracting the attempts and writing attempts in fixed-size batches.
+
+    Each batch of attempts is flattened with the same extract functions as the in-memory path
+    and handed to the writers straight away, so peak memory is bounded by the batch size rather
+    than by the size of the file.
+
+    Parameters:
+    raw_json_file: file object
+    The raw NAPLAN file, opened in binary mode.
+
+    attempts_writer: BatchCsvWriter
+    The writer the extracted attempts are written to.
+
+    writing_attempts_writer: BatchCsvWriter
+    The writer the extracted writing attempts are written to.
+
+    batch_size: int
+    The number of attempt records to flatten at a time.
+
+    batch_summaries: list
+    The answer counts and student scores of each batch are appended to this list for the aggregate tables, along with
+    the students extracted from the batch, None to not summarize.
+
+    Returns:
+    extract_data.ParsedDocument
+    The parsed document holding every section of the file other than the attempts.
+    """
+    sections = {}
+    batch = []
+    for key, value in iter_sections(raw_json_file):
+        if key != "attempts":
+            sections[key] = value
+            continue
+
+        batch.append(value)
+        if len(batch) >= batch_size:
+            write_attempts_batch(batch, attempts_writer, writing_attempts_writer, batch_summaries)
+            batch = []
+
+    if batch:
+        write_attempts_batch(batch, attempts_writer, writing_attempts_writer, batch_summaries)
+
+    return extract_data.ParsedDocument(sections)
+
+
+def write_attempts_batch(batch, attempts_writer, writing_attempts_writer, batch_summaries=None):
+    """
+    Flatten a batch of attempt records and write them to the attempts and writing attempts writers.
+
+    Parameters:
+    batch: list
+    The attempt records from the raw NAPLAN file.
+
+    attempts_writer: BatchCsvWriter
+    The writer the extracted attempts are written to.
+
+    writing_attempts_writer: BatchCsvWriter
+    The writer the extracted writing attempts are written to.
+
+    batch_summaries: list
+    The list the answer counts, student scores and students of the batch are appended to, None to not summarize.
+
+    Returns:
+    None
+    """
+    document = extract_data.ParsedDocument({"attempts": batch})
+    attempt_tables = extract_data.extract_attempt_tables(document)
+    writing_attempt_tables = extract_data.extract_writing_attempt_tables(document)
+    attempts = attempt_tables.pop("attempts")
+    writing_attempts = writing_attempt_tables.pop("writing_attempts")
+    if batch_summaries is not None:
+        summary = aggregates.summarize_attempts(attempts, writing_attempts)
+        summary["attempt_tables"] = attempt_tables
+        summary["writing_attempt_tables"] = writing_attempt_tables
+        batch_summaries.append(summary)
+    attempts_writer.write(attempts)
+    writing_attempts_writer.write(writing_attempts)
+
+
+class BatchCsvWriter(export_tables.CsvAppendSink):
+    """
+    Write a table to a CSV file one batch at a time.
+
+    Each batch is spooled to disk as soon as it is written and copied into the CSV with the
+    columns and dtypes of the whole table once the writer is closed, see export_tables.CsvAppendSink.
+
+    Parameters:
+    path: str
+    The path of the CSV file to write.
+    """
+    def write(self, df):
+        """
+        Spool a batch of rows to disk.
+
+        Parameters:
+        df: pd.DataFrame
+        The batch of rows to write.
+
+        Returns:
+        None
+        """
+        # A batch is only part of a file, one with no rows says nothing about the table's columns
+        if df.empty:
+            return
+        super().write(df)
@@ -0,0 +1,115 @@
+import pandas as pd
+
+
+def align_categories(frames):
+    """
+    Give each categorical column the same categories in every frame, so concatenating
+    the frames keeps the column categorical instead of falling back to object.
+
+    Parameters:
+    frames: list
+    The DataFrames that are going to be concatenated.
+
+    Returns:
+    list
+    The DataFrames with their categories aligned.
+    """
+    categories = {}
+    for df in frames:
+        for column in df.columns:
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                categories.setdefault(column, pd.Index([]))
+                categories[column] = categories[column].append(df[column].cat.categories).unique()
+
+    if not categories:
+        return frames
+
+    aligned = []
+    for df in frames:
+        df = df.copy(deep=False)
+        for column, column_categories in categories.items():
+            if column in df.columns and isinstance(df[column].dtype, pd.CategoricalDtype):
+                df[column] = df[column].cat.set_categories(column_categories)
+        aligned.append(df)
+    return aligned
+
+
+class TableAccumulator:
+    """
+    Collect the DataFrames extracted from each file and concatenate them once at the end.
+
+    Concatenating onto a running total copies every row collected so far each time a file
+    is added, collecting the frames and concatenating once only copies each row once.
+
+    Parameters:
+    name: str
+    The name of the table, used when reporting.
+
+    deduplicate: bool
+    Whether to drop duplicate rows once the table has been built.
+
+    key: list
+    The columns a duplicate row is identified by, None to compare whole rows.
+    """
+    def __init__(self, name, deduplicate=False, key=None):
+        self.name = name
+        self.deduplicate = deduplicate
+        self.key = key
+        self._frames = []
+        self._table = None
+
+    def add(self, df):
+        """
+        Add the DataFrame extracted from one file to the table.
+
+        Parameters:
+        df: pd.DataFrame
+        The rows to add.
+
+        Returns:
+        None
+        """
+        # Adding more rows after the table has been built starts from the built table
+        if self._table is not None:
+            self._frames = [self._table]
+            self._table = None
+
+        self._frames.append(df)
+
+    def build(self):
+        """
+        Concatenate every collected DataFrame into the table, dropping duplicates once if required.
+
+        Returns:
+        pd.DataFrame
+        The table.
+        """
+        if self._table is None:
+            if self._frames:
+                self._table = pd.concat(align_categories(self._frames), ignore_index=True)
+            else:
+                self._table = pd.DataFrame()
+
+            if self.deduplicate:
+                key = [column for column in self.key if column in self._table.columns] if self.key else None
+                self._table = self._table.drop_duplicates(subset=key or None)
+
+            # The collected frames are no longer needed once they are in the table
+            self._frames = []
+
+        return self._table
+
+    def report(self):
+        """
+        Report the size of the built table.
+
+        Returns:
+        dict
+        The name of the table with its number of rows and size in bytes.
+        """
+        table = self.build()
+        return {
+            "table": self.name,
+            "rows": len(table),
+            "bytes": int(table.memory_usage(index=True, deep=True).sum()),
+        }
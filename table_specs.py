@@ -0,0 +1,226 @@
+import pandas as pd
+
+# Marks a field that isn't in a record, as opposed to one that is there but null
+MISSING = object()
+
+
+def field_getter(path):
+    """
+    Build a function that reads a dotted field path from a record, the same way pd.json_normalize names nested fields.
+
+    Parameters:
+    path: str
+    The dotted path of the field, such as "student.metadata.schoolStudentId".
+
+    Returns:
+    callable
+    A function taking a record and returning the value of the field, or MISSING.
+    """
+    keys = path.split(".")
+
+    def get(record):
+        for key in keys:
+            if not isinstance(record, dict) or key not in record:
+                return MISSING
+            record = record[key]
+        return record
+    return get
+
+
+def normalize_records(records, drop=()):
+    """
+    Normalize a list of records into a DataFrame, leaving out the dropped fields, and only paying
+    for pd.json_normalize when a record has nested fields.
+
+    Parameters:
+    records: list
+    The records to normalize.
+
+    drop: set
+    The fields to leave out.
+
+    Returns:
+    pd.DataFrame
+    The normalized records, with nested fields flattened into dotted column names.
+    """
+    # Leave out the dropped fields while checking the rest for nested records
+    rows = []
+    nested = False
+    for record in records:
+        row = {key: value for key, value in record.items() if key not in drop} if drop else record
+        if not nested and dict in map(type, row.values()):
+            nested = True
+        rows.append(row)
+
+    # The dropped fields are already left out of the rows, so nothing nested under them is flattened
+    if nested:
+        return pd.json_normalize(rows)
+
+    # Flat records give the same columns in the same order either way
+    return pd.DataFrame(rows)
+
+
+def compile_spec(spec):
+    """
+    Compile a table spec into a function that extracts the table from a parsed document in a single pass.
+
+    A spec is a dict with:
+
+    name: the name of the table.
+    source: the ParsedDocument attribute holding the list of source records.
+    columns: the fields of the source records to keep, in order, fields that no record has are left out.
+    filters: the kept fields that must not be blank, applied to the source records before anything is exploded.
+    explode: the record paths to walk, each one a list field of the level above, as dicts with:
+        path: the list field to explode.
+        drop: the fields of the exploded records to leave out.
+        missing_message: printed instead of adding the level's columns when no record has the field.
+    row_filters: the fields that must not be blank in the finished rows.
+    dtypes: the dtype of any column that needs casting.
+    tables: any other tables to build from the same source records in the same pass, keyed by
+        table name, as dicts with columns and filters like the spec's own and unique, a field
+        only the first record with each value of is kept for.
+
+    Only the kept fields of the source records are ever built into columns. Each exploded record
+    is normalized once, without its dropped fields, and the rows are built by taking the parent
+    records of each row by position, so parent fields are carried down without repeated explode
+    and join steps. An empty or missing list gives one row with the exploded fields blank, the
+    same as exploding it.
+
+    Parameters:
+    spec: dict
+    The table spec.
+
+    Returns:
+    callable
+    A function taking a ParsedDocument and any constant columns for the table as keyword arguments,
+    returning a dict of the table and the other tables keyed by table name.
+    """
+    name = spec["name"]
+    source = spec["source"]
+    columns = list(spec.get("columns", []))
+    getters = [(column, field_getter(column)) for column in columns]
+    filters = list(spec.get("filters", []))
+    levels = [dict(level, drop=set(level.get("drop", ()))) for level in spec.get("explode", [])]
+    row_filters = list(spec.get("row_filters", []))
+    dtypes = dict(spec.get("dtypes", {}))
+    side_tables = {
+        side_name: {
+            "columns": list(side_spec["columns"]),
+            "getters": [(column, field_getter(column)) for column in side_spec["columns"]],
+            "filters": list(side_spec.get("filters", [])),
+            "unique": field_getter(side_spec["unique"]) if "unique" in side_spec else None,
+        }
+        for side_name, side_spec in spec.get("tables", {}).items()
+    }
+
+    def keep_present(df, names):
+        # A filter on a field no record has leaves no rows
+        mask = pd.Series(True, index=df.index)
+        for name in names:
+            mask &= df[name].notna() if name in df.columns else False
+        return df[mask]
+
+    def build_row(record, row_getters):
+        row = {}
+        for column, get in row_getters:
+            value = get(record)
+            if value is not MISSING:
+                row[column] = value
+        return row
+
+    def flatten(records):
+        # Build only the kept fields of the source records, the types are worked out over every record
+        # before filtering, as they were when the whole section was normalized. The other tables
+        # are built in the same pass, a dictionary of the unique values seen so far means each
+        # repeated record is skipped before its row is built
+        rows = []
+        side_rows = {side_name: [] for side_name in side_tables}
+        seen = {side_name: {} for side_name in side_tables}
+        for record in records:
+            rows.append(build_row(record, getters))
+            for side_name, side in side_tables.items():
+                if side["unique"] is not None:
+                    value = side["unique"](record)
+                    if value is MISSING or value is None or value in seen[side_name]:
+                        continue
+                    seen[side_name][value] = True
+                side_rows[side_name].append(build_row(record, side["getters"]))
+
+        tables = {}
+        for side_name, side in side_tables.items():
+            side_table = pd.DataFrame(side_rows[side_name])
+            side_table = side_table[[column for column in side["columns"] if column in side_table.columns]]
+            tables[side_name] = keep_present(side_table, side["filters"]).reset_index(drop=True)
+
+        table = pd.DataFrame(rows)
+        table = table[[column for column in columns if column in table.columns]]
+        table = keep_present(table, filters)
+
+        # Walk each explode path once, keeping the position of every row's parent at each level
+        parents = [records[position] for position in table.index]
+        positions = [list(range(len(parents)))]
+        frames = []
+        for depth, level in enumerate(levels):
+            path = level["path"]
+            level_records = []
+            level_positions = []
+            parent_positions = []
+            found = False
+            for parent_position, parent in enumerate(parents):
+                children = parent.get(path, MISSING) if isinstance(parent, dict) else MISSING
+                if children is not MISSING:
+                    found = True
+                if not isinstance(children, list) or not children:
+                    children = [None]
+                for child in children:
+                    parent_positions.append(parent_position)
+                    if isinstance(child, dict):
+                        level_positions.append(len(level_records))
+                        level_records.append(child)
+                    else:
+                        level_positions.append(-1)
+
+            # Carry every earlier level down to the rows of this level
+            positions = [[earlier[parent] for parent in parent_positions] for earlier in positions]
+
+            if not found and "missing_message" in level:
+                print(level["missing_message"])
+                frames.append(None)
+            else:
+                # The paths exploded further down are walked from the records rather than built as columns
+                drop = level["drop"] | {deeper["path"] for deeper in levels[depth + 1:]}
+                frames.append(normalize_records(level_records, drop))
+
+            parents = [level_records[position] if position >= 0 else None for position in level_positions]
+            positions.append(level_positions)
+
+        # Blank positions reindex to blank rows, just as an empty list explodes to a blank value
+        parts = [table.take(positions[0]).reset_index(drop=True)]
+        for frame, level_positions in zip(frames, positions[1:]):
+            if frame is not None:
+                parts.append(frame.reindex(level_positions).reset_index(drop=True))
+        result = pd.concat(parts, axis=1) if len(parts) > 1 else parts[0]
+
+        tables[name] = keep_present(result, row_filters)
+        return tables
+
+    def extract(document, **constants):
+        records = getattr(document, source)
+
+        # Nothing to flatten if the document has no source records
+        if records:
+            tables = flatten(records)
+        else:
+            tables = {table_name: pd.DataFrame() for table_name in [name] + list(side_tables)}
+
+        result = tables[name]
+        for column, value in constants.items():
+            result[column] = value
+
+        for column, dtype in dtypes.items():
+            if column in result.columns:
+                result[column] = result[column].astype(dtype)
+
+        return tables
+
+    return extract
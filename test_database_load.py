@@ -0,0 +1,79 @@
+import json
+import os
+import sqlite3
+import tempfile
+import unittest
+import database_load
+import raw_sources
+from generate_synthetic_data import generate_naplan_file
+
+# The columns that depend on when the rows were loaded rather than what was loaded
+LOAD_COLUMNS = ["id", "loadedOn"]
+
+
+def write_file(directory, name, year, **options):
+    with open(os.path.join(directory, name), "w") as raw_json_file:
+        json.dump(generate_naplan_file(year, students=12, answers_per_attempt=4, marking_scheme_components=3,
+                                       response_words=5, **options), raw_json_file)
+
+
+def load(database_path, directory, incremental):
+    sources = raw_sources.discover_sources(directory)
+    database_load.load_database(database_path, [source.name for source in sources], sources, [source.year for source in sources],
+                                incremental)
+
+
+def dump(database_path):
+    conn = sqlite3.connect(database_path)
+    try:
+        tables = {}
+        for table, in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite%'"):
+            columns = [column for _, column, *_ in conn.execute(f"PRAGMA table_info({table})") if column not in LOAD_COLUMNS]
+            tables[table] = sorted(map(repr, conn.execute(f"SELECT {', '.join(columns)} FROM {table}")))
+        return tables
+    finally:
+        conn.close()
+
+
+class IncrementalLoadTest(unittest.TestCase):
+    """
+    An incremental load has to leave the database the same as a full rebuild of the same raw files.
+    Every file uses the same seed, so they share students whose details change from year to year.
+    """
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.raw_data = os.path.join(self.directory.name, "raw_data")
+        os.makedirs(self.raw_data)
+        self.database = os.path.join(self.directory.name, "incremental.db")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def assert_matches_full_load(self):
+        load(self.database, self.raw_data, incremental=True)
+        full_database = os.path.join(self.directory.name, "full.db")
+        load(full_database, self.raw_data, incremental=False)
+        self.assertEqual(dump(self.database), dump(full_database))
+        os.remove(full_database)
+
+    def test_add_change_and_remove_files(self):
+        write_file(self.raw_data, "2022 School Export.json", 2022)
+        write_file(self.raw_data, "2023 School Export.json", 2023)
+        load(self.database, self.raw_data, incremental=False)
+
+        write_file(self.raw_data, "2024 School Export.json", 2024)
+        self.assert_matches_full_load()
+
+        write_file(self.raw_data, "2023 School Export.json", 2023, marked=False, seed=1)
+        self.assert_matches_full_load()
+
+        os.remove(os.path.join(self.raw_data, "2022 School Export.json"))
+        self.assert_matches_full_load()
+
+        os.remove(os.path.join(self.raw_data, "2024 School Export.json"))
+        self.assert_matches_full_load()
+        self.assertEqual(len(dump(self.database)["naplan_students"]), 12)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import time
+import traceback
+import raw_sources
+
+# How often the raw data directory is checked for changes
+DEFAULT_POLL_SECONDS = 2.0
+
+# How long the raw files have to stay the same before they are read, so a file that is still
+# being copied in is never read part way through
+DEFAULT_SETTLE_SECONDS = 5.0
+
+
+def snapshot(directory):
+    """
+    Record the size and modification time of each raw file in a directory.
+
+    Parameters:
+    directory: str
+    The directory holding the raw files.
+
+    Returns:
+    dict
+    The (size, modification time) of each raw file, keyed by file name.
+    """
+    files = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.is_file() and raw_sources.is_raw_file(entry.name):
+                stat = entry.stat()
+                files[entry.name] = (stat.st_size, stat.st_mtime_ns)
+    return files
+
+
+def describe_changes(before, after):
+    """
+    Describe how the raw files changed between two snapshots.
+
+    Parameters:
+    before: dict
+    The earlier snapshot.
+
+    after: dict
+    The later snapshot.
+
+    Returns:
+    list
+    A line for each file that was added, changed or removed.
+    """
+    changes = []
+    for file, stat in after.items():
+        if file not in before:
+            changes.append(f"New file: {file}")
+        elif before[file] != stat:
+            changes.append(f"Changed file: {file}")
+    changes.extend(f"Removed file: {file}" for file in before if file not in after)
+    return changes
+
+
+def watch_directory(directory, on_change, poll_seconds=DEFAULT_POLL_SECONDS, settle_seconds=DEFAULT_SETTLE_SECONDS):
+    """
+    Watch a directory for new, changed or removed raw files and call on_change once they have settled.
+
+    The directory is polled rather than relying on filesystem events, which aren't reported
+    reliably for network drives. The run starts once the raw files have stayed the same for
+    settle_seconds, any change while waiting starts the wait again. on_change is also called
+    once the files have settled on start up. A failed run is reported and the watch carries on,
+    the run is tried again the next time the raw files change.
+
+    Parameters:
+    directory: str
+    The directory holding the raw files.
+
+    on_change: callable
+    Called with no arguments to process the raw files.
+
+    poll_seconds: float
+    How often to check the directory.
+
+    settle_seconds: float
+    How long the raw files have to stay the same before on_change is called.
+
+    Returns:
+    None
+    """
+    processed = {}
+    last = snapshot(directory)
+    changed_at = time.monotonic()
+    first_run = True
+    print(f"Watching '{directory}' for new or changed files, press Ctrl+C to stop")
+
+    while True:
+        current = snapshot(directory)
+        now = time.monotonic()
+        if current != last:
+            last = current
+            changed_at = now
+        elif (first_run or current != processed) and now - changed_at >= settle_seconds:
+            if not first_run:
+                for change in describe_changes(processed, current):
+                    print(change)
+
+            try:
+                on_change()
+            except Exception:
+                traceback.print_exc()
+                print("The run failed, it will be tried again when the raw files next change")
+
+            # Changes made during the run are picked up on the next poll
+            processed = current
+            first_run = False
+            print(f"Waiting for changes to '{directory}'")
+
+        time.sleep(poll_seconds)